@@ -0,0 +1,691 @@
+#!/usr/bin/env python3
+"""
+Business Card Generator Benchmarks
+Generates a deterministic synthetic card corpus and times each stage of the
+generator pipeline, writing JSON results that can be compared between commits.
+"""
+
+import argparse
+import base64
+import io
+import itertools
+import json
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from functools import partial
+from pathlib import Path
+
+import qrcode
+from PIL import Image
+
+import generate
+
+
+# Field-length distributions for the synthetic corpus. Each profile gives the
+# probability that an optional field is missing, that text uses non-ASCII
+# characters, that social links are present, and the (min, max) length of
+# generated names and URL paths.
+PROFILES = {
+    "typical": {
+        "missing": 0.1, "unicode": 0.1, "social": 0.5,
+        "name_words": (2, 3), "url_path": (0, 20),
+    },
+    "long": {
+        "missing": 0.0, "unicode": 0.1, "social": 1.0,
+        "name_words": (3, 6), "url_path": (40, 120),
+    },
+    "unicode": {
+        "missing": 0.1, "unicode": 1.0, "social": 0.5,
+        "name_words": (2, 4), "url_path": (0, 30),
+    },
+    "sparse": {
+        "missing": 0.7, "unicode": 0.1, "social": 0.2,
+        "name_words": (1, 2), "url_path": (0, 10),
+    },
+}
+
+ASCII_WORDS = [
+    "john", "maria", "garcia", "smith", "lee", "ann", "robert", "chen", "patel",
+    "williams", "okafor", "nguyen", "kowalski", "schmidt", "rossi", "silva",
+]
+UNICODE_WORDS = [
+    "José", "Núñez", "Zoë", "Łukasz", "Müller", "Ångström", "Søren", "François",
+    "Дмитрий", "Ελένη", "王芳", "佐藤", "Çelik", "Đorđe", "Brontë", "Siân",
+]
+COMPANIES = ["Acme", "Example Corp", "Initech", "Globex, Inc.", "Umbrella; Ltd", "Hooli"]
+TITLES = ["Engineer", "Senior Software Engineer", "VP, Sales", "CTO", "Designer"]
+OPTIONAL_FIELDS = ("email", "phone", "company", "title", "website")
+SOCIAL_FIELDS = ("linkedin", "github", "twitter")
+
+
+def _url_path(rng, length_range):
+    length = rng.randint(*length_range)
+    return "".join(rng.choice("abcdefghijklmnopqrstuvwxyz0123456789-_/") for _ in range(length))
+
+
+def make_card(rng, profile):
+    """Build one synthetic card from a profile."""
+    words = UNICODE_WORDS if rng.random() < profile["unicode"] else ASCII_WORDS
+    name = " ".join(rng.choice(words).capitalize() for _ in range(rng.randint(*profile["name_words"])))
+    handle = generate.slugify_name(name) or f"user{rng.randint(1, 99999)}"
+    card = {
+        "name": name,
+        "email": f"{handle}@example.com",
+        "phone": f"+1-555-{rng.randint(100, 999)}-{rng.randint(0, 9999):04d}",
+        "company": rng.choice(COMPANIES),
+        "title": rng.choice(TITLES),
+        "website": f"https://www.{handle}.example/{_url_path(rng, profile['url_path'])}",
+    }
+    for field in OPTIONAL_FIELDS:
+        if rng.random() < profile["missing"]:
+            del card[field]
+    if rng.random() < profile["social"]:
+        card["linkedin"] = f"https://www.linkedin.com/in/{handle}{_url_path(rng, profile['url_path'])}"
+        card["github"] = f"https://github.com/{handle}"
+        card["twitter"] = f"https://twitter.com/{handle}"
+    return card
+
+
+def make_corpus(count, seed=0, profile="mixed"):
+    """Build a deterministic list of ``count`` synthetic cards."""
+    rng = random.Random(seed)
+    names = sorted(PROFILES)
+    cards = []
+    for index in range(count):
+        name = names[index % len(names)] if profile == "mixed" else profile
+        cards.append(make_card(rng, PROFILES[name]))
+    return cards
+
+
+def write_corpus(cards, output_dir):
+    """Write one JSON file per card, named so that sorting keeps the order."""
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    width = max(6, len(str(len(cards))))
+    for index, card in enumerate(cards):
+        path = output_dir / f"card-{index:0{width}d}.json"
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(card, f, ensure_ascii=False)
+
+
+def write_corpus_jsonl(cards, path):
+    """Write the corpus as a JSON Lines file."""
+    with open(path, 'w', encoding='utf-8') as f:
+        for card in cards:
+            f.write(json.dumps(card, ensure_ascii=False))
+            f.write("\n")
+
+
+# name -> benchmark function. A benchmark takes (cards, args, work_dir) and
+# returns ``(run, items)``: ``run()`` processes ``items`` items once. It may
+# add a third element, the average output size in bytes per item, for
+# benchmarks where size matters as much as speed. It returns None instead if
+# it cannot run here (e.g. an optional dependency is missing).
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    """Register a benchmark under ``name``."""
+    def register(func):
+        BENCHMARKS[name] = func
+        return func
+    return register
+
+
+@benchmark("escape_vcard")
+def bench_escape_vcard(cards, args, work_dir):
+    values = [value for card in cards for value in card.values()]
+
+    def run():
+        for value in values:
+            generate.escape_vcard(value)
+    return run, len(values)
+
+
+def bench_escape_fields(values):
+    """Escape every value in ``values`` once per run."""
+    def run():
+        for value in values:
+            generate.escape_vcard(value)
+    return run, len(values)
+
+
+@benchmark("escape_vcard[short]")
+def bench_escape_vcard_short(cards, args, work_dir):
+    values = [value for card in cards for value in card.values() if len(value) <= 24]
+    return bench_escape_fields(values)
+
+
+@benchmark("escape_vcard[long]")
+def bench_escape_vcard_long(cards, args, work_dir):
+    # Every field padded to about 500 characters, with the separators that
+    # need escaping mixed in
+    values = [(value + ", ; \\ ") * (500 // (len(value) + 6) + 1)
+              for card in cards for value in card.values()]
+    return bench_escape_fields(values)
+
+
+@benchmark("generate_vcard")
+def bench_generate_vcard(cards, args, work_dir):
+    def run():
+        for card in cards:
+            generate.generate_vcard(card)
+    return run, len(cards)
+
+
+@benchmark("generate_vcard[fold]")
+def bench_generate_vcard_fold(cards, args, work_dir):
+    def run():
+        for card in cards:
+            generate.generate_vcard(card, fold=True)
+    return run, len(cards)
+
+
+@benchmark("generate_qr_code[png]")
+def bench_generate_qr_png(cards, args, work_dir):
+    vcards = [generate.generate_vcard(card) for card in cards]
+
+    def run():
+        for vcard in vcards:
+            generate.generate_qr_code(vcard)
+    return run, len(vcards)
+
+
+@benchmark("generate_qr_code[optimal]")
+def bench_generate_qr_optimal(cards, args, work_dir):
+    vcards = [generate.generate_vcard(card) for card in cards]
+
+    def run():
+        for vcard in vcards:
+            generate.generate_qr_code(vcard, segmentation="optimal")
+    return run, len(vcards)
+
+
+@benchmark("generate_qr_code[svg]")
+def bench_generate_qr_svg(cards, args, work_dir):
+    vcards = [generate.generate_vcard(card) for card in cards]
+
+    def run():
+        for vcard in vcards:
+            generate.generate_qr_code(vcard, output_format="svg")
+    return run, len(vcards)
+
+
+def bench_encode_png(png_encoder, cards, args, work_dir):
+    """Encode the corpus QR symbols as PNG; reports the data URI size."""
+    symbols = [generate.make_qr(generate.generate_vcard(card)) for card in cards]
+    sizes = [len(base64.b64encode(generate.qr_png_bytes(qr, png_encoder=png_encoder)))
+             for qr in symbols]
+
+    def run():
+        for qr in symbols:
+            generate.qr_png_bytes(qr, png_encoder=png_encoder)
+    return run, len(symbols), statistics.mean(sizes)
+
+
+for _png_encoder in generate.PNG_ENCODERS:
+    benchmark(f"encode_png[{_png_encoder}]")(partial(bench_encode_png, _png_encoder))
+
+
+# QR versions used by the per-version rasterizer benchmarks.
+QR_BENCH_VERSIONS = (1, 5, 10, 15, 20, 25, 30, 40)
+
+
+def qr_for_version(version):
+    """A made QR symbol of exactly ``version``, using the generator's settings."""
+    qr = qrcode.QRCode(
+        version=version,
+        error_correction=generate.QR_ERROR_CORRECTION,
+        box_size=generate.QR_BOX_SIZE,
+        border=generate.QR_BORDER,
+    )
+    qr.add_data(f"QR version {version}")
+    qr.make(fit=False)
+    return qr
+
+
+def bench_rasterize(version, rasterizer, cards, args, work_dir):
+    """Rasterize and PNG-encode one QR symbol of a given version."""
+    if rasterizer == "numpy" and generate.numpy is None:
+        return None
+    qr = qr_for_version(version)
+    rounds = 20
+
+    def run():
+        for _ in range(rounds):
+            generate.qr_png_bytes(qr, rasterizer)
+    return run, rounds
+
+
+for _version in QR_BENCH_VERSIONS:
+    for _rasterizer in generate.QR_RASTERIZERS:
+        benchmark(f"rasterize_v{_version}[{_rasterizer}]")(
+            partial(bench_rasterize, _version, _rasterizer))
+
+
+def bench_render_template(renderer, minify, cards, args, work_dir):
+    """Render the corpus to one file; reports the page size."""
+    qr_code = generate.generate_qr_code(generate.generate_vcard(cards[0]))
+    output_path = Path(work_dir) / "render.html"
+
+    def render(card):
+        return generate.render_template(args.template, output_path, card, qr_code,
+                                        renderer=renderer, minify=minify)
+    sizes = [render(card) for card in cards]
+
+    def run():
+        for card in cards:
+            render(card)
+    return run, len(cards), statistics.mean(sizes)
+
+
+benchmark("render_template")(partial(bench_render_template, "jinja", False))
+benchmark("render_template[skeleton]")(partial(bench_render_template, "skeleton", False))
+benchmark("render_template[minify]")(partial(bench_render_template, "jinja", True))
+
+
+@benchmark("main")
+def bench_main(cards, args, work_dir):
+    input_dir = Path(work_dir) / "main-input"
+    write_corpus(cards, input_dir)
+    runs = [0]
+
+    def run():
+        runs[0] += 1
+        argv = [
+            "--input-dir", str(input_dir),
+            "--output-dir", str(Path(work_dir) / f"main-output-{runs[0]}"),
+            "--template", str(args.template),
+            "--cache-dir", str(Path(work_dir) / f"main-cache-{runs[0]}"),
+            "--qr-cache-size", "0",
+            "--workers", str(args.workers),
+        ]
+        with redirect_stdout(io.StringIO()):
+            generate.main(argv)
+    return run, len(cards)
+
+
+def time_benchmark(run, items, repeat):
+    """Run a benchmark ``repeat`` times and summarise the per-item cost."""
+    per_item = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        per_item.append((time.perf_counter() - start) / items)
+    median = statistics.median(per_item)
+    return {
+        "items": items,
+        "repeat": repeat,
+        "per_item_ms_min": min(per_item) * 1000,
+        "per_item_ms_median": median * 1000,
+        "items_per_second": 1 / median if median > 0 else 0.0,
+    }
+
+
+def git_revision():
+    """Short hash of the checked out commit, if available."""
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=Path(__file__).parent, capture_output=True, text=True, check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout.strip()
+
+
+def run_benchmarks(args):
+    """Run the selected benchmarks and return the results document."""
+    cards = make_corpus(args.count, args.seed, args.profile)
+    selected = args.only.split(",") if args.only else list(BENCHMARKS)
+    unknown = [name for name in selected if name not in BENCHMARKS]
+    if unknown:
+        print(f"Error: Unknown benchmark(s): {', '.join(unknown)}")
+        sys.exit(1)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as work_dir:
+        for name in selected:
+            benchmark_run = BENCHMARKS[name](cards, args, work_dir)
+            if benchmark_run is None:
+                print(f"   {name:<28}{'skipped':>10}")
+                continue
+            run, items = benchmark_run[:2]
+            repeat = 1 if name == "main" else args.repeat
+            results[name] = time_benchmark(run, items, repeat)
+            line = (f"   {name:<28}{results[name]['per_item_ms_median']:>10.4f} ms/item"
+                    f"{results[name]['items_per_second']:>14.1f} items/s")
+            if len(benchmark_run) > 2:
+                results[name]["bytes_per_item"] = benchmark_run[2]
+                line += f"{benchmark_run[2]:>12.0f} B/item"
+            print(line)
+    return {
+        "meta": {
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "count": args.count,
+            "seed": args.seed,
+            "profile": args.profile,
+            "workers": args.workers,
+        },
+        "benchmarks": results,
+    }
+
+
+def verify_renderers(args):
+    """
+    Render every corpus card with Jinja and with the skeleton renderer, for
+    both QR formats, stylesheet modes and with and without minification, and
+    return the cards whose pages differ.
+    """
+    template_dir = args.template.parent
+    if generate.get_template_skeleton(
+            generate.get_template_environment(template_dir), args.template.name) is None:
+        print(f"⚠️  {args.template} uses constructs the skeleton renderer does not "
+              "support; it falls back to Jinja")
+    cards = make_corpus(args.count, args.seed, args.profile)
+    mismatches = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        reference = Path(work_dir) / "jinja.html"
+        candidate = Path(work_dir) / "skeleton.html"
+        for index, card in enumerate(cards):
+            vcard = generate.generate_vcard(card)
+            for qr_format in generate.QR_FORMATS:
+                qr_code = generate.generate_qr_code(vcard, output_format=qr_format)
+                qr_uri, qr_svg = (None, qr_code) if qr_format == "svg" else (qr_code, None)
+                for stylesheet_href, minify in itertools.product(
+                        (None, "styles.0123456789ab.css"), (False, True)):
+                    for renderer, path in (("jinja", reference), ("skeleton", candidate)):
+                        generate.render_template(args.template, path, card, qr_uri,
+                                                 qr_svg=qr_svg, renderer=renderer,
+                                                 stylesheet_href=stylesheet_href,
+                                                 minify=minify)
+                    if reference.read_bytes() != candidate.read_bytes():
+                        mismatches.append((index, qr_format))
+    return mismatches
+
+
+# Character sets for the payloads verify-qr generates: digits, QR
+# alphanumerics, vCard-like mixed ASCII, and text with multi-byte characters.
+QR_ALPHABETS = (
+    "0123456789",
+    qrcode.util.ALPHA_NUM.decode("ascii"),
+    "BEGIN:VCARD\nTEL:+1-555-0123 john@example.com",
+    "Zoë Ñúñez 東京 0123 ABC",
+)
+
+
+def brute_force_segment_bits(data, version):
+    """Fewest bits for ``data`` over every assignment of a mode to each byte."""
+    raw = data.encode("utf-8")
+    choices = []
+    for byte in raw:
+        modes = [qrcode.util.MODE_8BIT_BYTE]
+        if byte in generate._ALPHANUMERIC_BYTES:
+            modes.append(qrcode.util.MODE_ALPHA_NUM)
+        if byte in generate._NUMERIC_BYTES:
+            modes.append(qrcode.util.MODE_NUMBER)
+        choices.append(modes)
+    best = None
+    for modes in itertools.product(*choices):
+        bits = sum(generate.qr_segment_bits(mode, len(list(run)), version)
+                   for mode, run in itertools.groupby(modes))
+        best = bits if best is None else min(best, bits)
+    return best
+
+
+def decode_segments(buffer, version):
+    """Read back the bytes of a segment bitstream written as qrcode writes one."""
+    position = 0
+
+    def read(bits):
+        nonlocal position
+        value = 0
+        for index in range(position, position + bits):
+            value = (value << 1) | buffer.get(index)
+        position += bits
+        return value
+
+    decoded = bytearray()
+    while position < len(buffer):
+        mode = read(4)
+        count = read(qrcode.util.length_in_bits(mode, version))
+        if mode == qrcode.util.MODE_NUMBER:
+            for start in range(0, count, 3):
+                digits = min(3, count - start)
+                decoded += str(read((0, 4, 7, 10)[digits])).zfill(digits).encode("ascii")
+        elif mode == qrcode.util.MODE_ALPHA_NUM:
+            for start in range(0, count, 2):
+                if count - start == 1:
+                    decoded.append(qrcode.util.ALPHA_NUM[read(6)])
+                else:
+                    pair = read(11)
+                    decoded.append(qrcode.util.ALPHA_NUM[pair // 45])
+                    decoded.append(qrcode.util.ALPHA_NUM[pair % 45])
+        else:
+            decoded += bytes(read(8) for _ in range(count))
+    return bytes(decoded)
+
+
+def verify_qr(args):
+    """
+    Check the QR shortcuts against what they replace, and return a list of
+    failures:
+
+    - minimal_qr_version() against qrcode's own best fit, for payloads of
+      1 to ``args.max_length`` characters
+    - optimal_qr_segments() against a brute-force search over short payloads,
+      and its segments against a bitstream round trip on the corpus vCards
+    - the NumPy rasterizer's PNG against Pillow's, byte for byte, and the
+      lean PNG encoder's image against Pillow's, pixel for pixel, on the
+      corpus (the NumPy check is skipped without NumPy)
+    """
+    rng = random.Random(args.seed)
+    failures = []
+    counts = {"versions": 0, "segmentations": 0, "round trips": 0, "images": 0}
+
+    for length in range(1, args.max_length + 1):
+        payload = "".join(rng.choice(QR_ALPHABETS[length % len(QR_ALPHABETS)])
+                          for _ in range(length))
+        qr = qrcode.QRCode(error_correction=generate.QR_ERROR_CORRECTION)
+        qr.add_data(payload)
+        try:
+            expected = qr.best_fit()
+        except (qrcode.exceptions.DataOverflowError, ValueError):
+            # Depending on the qrcode release, overflow is one or the other
+            expected = None
+        actual = generate.minimal_qr_version(qr.data_list)
+        counts["versions"] += 1
+        if actual != expected:
+            failures.append(f"minimal_qr_version: {actual} != qrcode's {expected} "
+                            f"for a {length} character payload")
+
+    for _ in range(args.segment_samples):
+        alphabet = "".join(QR_ALPHABETS)
+        payload = "".join(rng.choice(alphabet) for _ in range(rng.randint(1, 7)))
+        for first, _last in generate.QR_VERSION_CLASSES:
+            segments = generate.optimal_qr_segments(payload, first)
+            bits = sum(generate.qr_segment_bits(segment.mode, len(segment), first)
+                       for segment in segments)
+            expected = brute_force_segment_bits(payload, first)
+            counts["segmentations"] += 1
+            if bits != expected:
+                failures.append(f"optimal_qr_segments: {bits} bits, brute force "
+                                f"{expected}, for {payload!r} at version {first}")
+
+    cards = make_corpus(args.count, args.seed, args.profile)
+    for index, card in enumerate(cards):
+        vcard = generate.generate_vcard(card)
+        # Segments are only valid at a version they fit in: below it a long
+        # segment can overflow its character count field
+        version, segments = generate.optimal_qr_version(vcard)
+        if version is not None:
+            buffer = qrcode.util.BitBuffer()
+            for segment in segments:
+                buffer.put(segment.mode, 4)
+                buffer.put(len(segment), qrcode.util.length_in_bits(segment.mode, version))
+                segment.write(buffer)
+            counts["round trips"] += 1
+            if decode_segments(buffer, version) != vcard.encode("utf-8"):
+                failures.append(f"optimal_qr_segments: card {index} does not round-trip "
+                                f"at version {version}")
+            elif len(buffer) != sum(generate.qr_segment_bits(s.mode, len(s), version)
+                                    for s in segments):
+                failures.append(f"qr_segment_bits: wrong size for card {index} "
+                                f"at version {version}")
+
+        qr = generate.make_qr(vcard)
+        reference = generate.qr_png_bytes(qr)
+        if generate.numpy is not None:
+            counts["images"] += 1
+            if generate.qr_png_bytes(qr, rasterizer="numpy") != reference:
+                failures.append(f"numpy rasterizer: card {index} is not byte-identical "
+                                "to Pillow's PNG")
+        with Image.open(io.BytesIO(reference)) as image:
+            size, pixels = image.size, image.convert("L").tobytes()
+        with Image.open(io.BytesIO(generate.qr_png_bytes(qr, png_encoder="lean"))) as image:
+            same = image.size == size and image.convert("L").tobytes() == pixels
+        counts["images"] += 1
+        if not same:
+            failures.append(f"lean PNG encoder: card {index} differs from Pillow's image")
+    return failures, counts
+
+
+def compare_results(baseline_path, current_path, threshold):
+    """Print per-benchmark ratios; return True if any regressed past ``threshold``."""
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)["benchmarks"]
+    with open(current_path, 'r', encoding='utf-8') as f:
+        current = json.load(f)["benchmarks"]
+    regressed = False
+    for name, result in current.items():
+        if name not in baseline:
+            continue
+        before = baseline[name]["per_item_ms_median"]
+        after = result["per_item_ms_median"]
+        ratio = after / before if before else float("inf")
+        marker = ""
+        if ratio > 1 + threshold:
+            marker = "  ⚠️  slower"
+            regressed = True
+        elif ratio < 1 - threshold:
+            marker = "  🚀 faster"
+        print(f"   {name:<28}{before:>10.4f} -> {after:>10.4f} ms/item  x{ratio:.2f}{marker}")
+    return regressed
+
+
+def parse_args(argv=None):
+    """Parse command line options."""
+    project_root = Path(__file__).parent
+    parser = argparse.ArgumentParser(description="Benchmark the business card generator.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    def add_corpus_options(subparser):
+        subparser.add_argument("--count", type=int, default=200,
+                               help="number of synthetic cards (default: 200)")
+        subparser.add_argument("--seed", type=int, default=0,
+                               help="random seed for the corpus (default: 0)")
+        subparser.add_argument("--profile", choices=["mixed"] + sorted(PROFILES),
+                               default="mixed",
+                               help="field-length distribution (default: mixed)")
+
+    corpus = subparsers.add_parser("corpus", help="write a synthetic corpus to disk")
+    add_corpus_options(corpus)
+    corpus.add_argument("output", type=Path,
+                        help="output directory, or a .jsonl file for JSON Lines")
+
+    run = subparsers.add_parser("run", help="run the benchmarks")
+    add_corpus_options(run)
+    run.add_argument("--repeat", type=int, default=5,
+                     help="timed repetitions per benchmark (default: 5)")
+    run.add_argument("--only", metavar="NAMES",
+                     help="comma separated benchmarks to run (default: all)")
+    run.add_argument("--template", type=Path,
+                     default=project_root / "templates" / "card.html",
+                     help="HTML template to render")
+    run.add_argument("-j", "--workers", type=int, default=1,
+                     help="worker processes for the end-to-end benchmark (default: 1)")
+    run.add_argument("--json", type=Path, metavar="PATH",
+                     help="write the results as JSON")
+
+    verify = subparsers.add_parser(
+        "verify-render", help="check that the skeleton renderer matches Jinja on the corpus")
+    add_corpus_options(verify)
+    verify.add_argument("--template", type=Path,
+                        default=project_root / "templates" / "card.html",
+                        help="HTML template to render")
+
+    verify_qr_parser = subparsers.add_parser(
+        "verify-qr", help="check the QR version, segmentation and PNG shortcuts")
+    add_corpus_options(verify_qr_parser)
+    verify_qr_parser.add_argument(
+        "--max-length", type=int, default=3000,
+        help="longest payload checked against qrcode's best fit (default: 3000)")
+    verify_qr_parser.add_argument(
+        "--segment-samples", type=int, default=300,
+        help="short payloads checked against a brute-force segmentation (default: 300)")
+
+    compare = subparsers.add_parser("compare", help="compare two JSON result files")
+    compare.add_argument("baseline", type=Path)
+    compare.add_argument("current", type=Path)
+    compare.add_argument("--threshold", type=float, default=0.1,
+                         help="relative change reported as a regression (default: 0.1)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Main entry point."""
+    args = parse_args(argv)
+
+    if args.command == "corpus":
+        cards = make_corpus(args.count, args.seed, args.profile)
+        if args.output.suffix == ".jsonl":
+            write_corpus_jsonl(cards, args.output)
+        else:
+            write_corpus(cards, args.output)
+        print(f"✅ Wrote {len(cards)} synthetic card(s) to: {args.output}")
+        return
+
+    if args.command == "verify-render":
+        mismatches = verify_renderers(args)
+        if mismatches:
+            print(f"❌ {len(mismatches)} page(s) differ between the Jinja and skeleton renderers:")
+            for index, qr_format in mismatches[:20]:
+                print(f"   - card {index} ({qr_format})")
+            sys.exit(1)
+        print(f"✅ Jinja and skeleton renderers match on {args.count} card(s)")
+        return
+
+    if args.command == "verify-qr":
+        failures, counts = verify_qr(args)
+        if failures:
+            print(f"❌ {len(failures)} QR check(s) failed:")
+            for failure in failures[:20]:
+                print(f"   - {failure}")
+            sys.exit(1)
+        checked = ", ".join(f"{count} {name}" for name, count in counts.items())
+        print(f"✅ QR checks passed ({checked})")
+        return
+
+    if args.command == "compare":
+        if compare_results(args.baseline, args.current, args.threshold):
+            sys.exit(1)
+        return
+
+    print(f"⏱️  Benchmarking {args.count} card(s) (profile: {args.profile}, seed: {args.seed})")
+    results = run_benchmarks(args)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"📈 Results written to: {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,22 +4,68 @@ Business Card Website Generator
 Generates a static HTML contact card from a JSON business card file with an embedded vCard QR code.
 """
 
+import argparse
 import json
+import math
+import multiprocessing.util
 import base64
+import gzip
+import hashlib
+import itertools
+import os
 import re
+import sqlite3
+import struct
 import sys
+import threading
+import time
+import unicodedata
+import zlib
+from array import array
+from bisect import bisect_left
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from functools import partial
 from pathlib import Path
 from io import BytesIO
+from queue import Queue
 from urllib.parse import quote
 
 try:
     import qrcode
+    import qrcode.util
     from PIL import Image
-    from jinja2 import Environment, FileSystemLoader
+    from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, TemplateError
+    from jinja2 import nodes
+    from markupsafe import escape as html_escape
 except ImportError:
     print("Error: Required packages not found. Install with: pip install -r requirements.txt")
     sys.exit(1)
 
+# Optional: enables the vectorized QR rasterizer (--qr-rasterizer numpy)
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Optional: adds .br sidecars to --precompress
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+class CardError(Exception):
+    """A single card could not be generated; the rest of the batch carries on."""
+
+
+def report_failure(failures, source, message):
+    """Print a per-card failure and add it to the ``failures`` list."""
+    print(f"Error: {source}: {message}")
+    if failures is not None:
+        failures.append((str(source), message))
+
 
 def load_business_card(json_path):
     """Load business card data from JSON file."""
@@ -28,17 +74,49 @@ def load_business_card(json_path):
             data = json.load(f)
         return data
     except FileNotFoundError:
-        print(f"Error: JSON file not found at {json_path}")
-        sys.exit(1)
-    except json.JSONDecodeError as e:
-        print(f"Error: Invalid JSON in {json_path}: {e}")
-        sys.exit(1)
+        raise CardError("JSON file not found")
+    except OSError as e:
+        raise CardError(f"Could not read JSON file: {e.strerror or e}")
+    except (json.JSONDecodeError, UnicodeDecodeError) as e:
+        raise CardError(f"Invalid JSON: {e}")
 
 
-def generate_vcard(data):
+def validate_business_card(data):
+    """Check that loaded card data has the required fields."""
+    if not isinstance(data, dict):
+        raise CardError("Card data must be a JSON object")
+    if not data.get('name'):
+        raise CardError("Missing required field 'name'")
+
+
+def iter_jsonl_cards(stream, source_name, failures=None):
+    """
+    Parse a JSON Lines stream (one card object per line) one record at a time.
+    Yields ``(line_number, data, input_hash)`` per card, so only the current
+    line is held in memory. Blank lines are ignored; invalid lines are
+    reported with their line number, added to ``failures`` and skipped.
+    """
+    for line_number, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            data = json.loads(line)
+        except (json.JSONDecodeError, UnicodeDecodeError) as e:
+            message = f"Invalid JSON on line {line_number}: {e}"
+        else:
+            if isinstance(data, dict):
+                yield line_number, data, hashlib.sha256(line).hexdigest()
+                continue
+            message = f"Line {line_number} is not a JSON object"
+        report_failure(failures, f"{source_name}:{line_number}", message)
+
+
+def generate_vcard(data, fold=False):
     """
     Generate vCard format string from business card data.
-    Uses vCard 3.0 format for maximum compatibility.
+    Uses vCard 3.0 format for maximum compatibility. With ``fold=True``
+    lines longer than 75 octets are folded (see fold_vcard_line()).
     """
     lines = [
         "BEGIN:VCARD",
@@ -46,11 +124,11 @@ def generate_vcard(data):
     ]
 
     # Full Name (required)
-    name = data.get('name', 'Unknown')
-    lines.append(f"FN:{escape_vcard(name)}")
+    name = escape_vcard(data.get('name', 'Unknown'))
+    lines.append(f"FN:{name}")
 
     # Structured Name
-    lines.append(f"N:{escape_vcard(name)};;;")
+    lines.append(f"N:{name};;;")
 
     # Title
     if data.get('title'):
@@ -83,51 +161,1109 @@ def generate_vcard(data):
         lines.append(f"URL;X-LABEL=Twitter:{escape_vcard(data['twitter'])}")
 
     lines.append("END:VCARD")
+    if fold:
+        lines = map(fold_vcard_line, lines)
+    return "\n".join(lines)
+
+
+# Optional card fields, and the ones that hold URLs.
+OPTIONAL_FIELDS = ("title", "company", "phone", "email", "website", "linkedin", "github",
+                   "twitter")
+URL_FIELDS = ("website", "linkedin", "github", "twitter")
+
+# Fields dropped, in this order, to fit --max-qr-version / --max-payload-bytes.
+DEFAULT_TRIM_ORDER = ("twitter", "github", "linkedin", "website", "title", "company")
+
+
+def generate_compact_vcard(data, fold=False):
+    """
+    Generate the smallest standards-valid vCard 3.0 for the same card.
+    Default and informational parameters (TYPE=WORK, TYPE=INTERNET,
+    X-LABEL) are dropped, N omits its empty trailing components and URLs
+    that repeat an earlier one are skipped. ``fold`` is as for
+    generate_vcard().
+    """
+    name = escape_vcard(data.get('name', 'Unknown'))
+    lines = ["BEGIN:VCARD", "VERSION:3.0", f"FN:{name}", f"N:{name}"]
+    for field, prop in (("title", "TITLE"), ("company", "ORG"),
+                        ("phone", "TEL"), ("email", "EMAIL")):
+        if data.get(field):
+            lines.append(f"{prop}:{escape_vcard(data[field])}")
+    seen = set()
+    for field in URL_FIELDS:
+        url = data.get(field)
+        if url and url not in seen:
+            seen.add(url)
+            lines.append(f"URL:{escape_vcard(url)}")
+    lines.append("END:VCARD")
+    if fold:
+        lines = map(fold_vcard_line, lines)
     return "\n".join(lines)
 
 
+def generate_mecard(data):
+    """
+    Generate a MECARD payload, the terse contact format read by most phone
+    QR scanners. MECARD has no title property, so the title goes in NOTE.
+    """
+    fields = [f"N:{escape_mecard(data.get('name', 'Unknown'))}"]
+    for field, prop in (("company", "ORG"), ("phone", "TEL"), ("email", "EMAIL")):
+        if data.get(field):
+            fields.append(f"{prop}:{escape_mecard(data[field])}")
+    seen = set()
+    for field in URL_FIELDS:
+        url = data.get(field)
+        if url and url not in seen:
+            seen.add(url)
+            fields.append(f"URL:{escape_mecard(url)}")
+    if data.get('title'):
+        fields.append(f"NOTE:{escape_mecard(data['title'])}")
+    return "MECARD:" + ";".join(fields) + ";;"
+
+
+def escape_mecard(text):
+    """Escape the characters MECARD reserves: backslash, colon and semicolon."""
+    return re.sub(r'([\\:;])', r'\\\1', str(text))
+
+
+# --vcard-format choices and the functions that build each payload.
+VCARD_FORMATS = {
+    "full": generate_vcard,
+    "compact": generate_compact_vcard,
+    "mecard": generate_mecard,
+}
+
+
 def escape_vcard(text):
-    """Escape special characters in vCard fields."""
+    """
+    Escape special characters in vCard fields (RFC 2426 section 4):
+    backslash, semicolon, comma and line breaks. LF, CRLF and a lone CR all
+    become the two characters ``\\n``.
+    """
     if not text:
         return ""
-    # Escape semicolons and commas in vCard format
-    text = str(text).replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,")
-    return text
+    text = str(text)
+    if "\r" in text:
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+    # Chained replace() beats a str.translate() table several times over:
+    # each call is one C-level scan that returns the string untouched when
+    # there is nothing to escape.
+    return (text.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,")
+            .replace("\n", "\\n"))
 
 
-def generate_qr_code(vcard_data):
+def fold_vcard_line(line, limit=75):
     """
-    Generate QR code from vCard data and return as base64 data URI.
+    Fold a content line longer than ``limit`` octets (RFC 2425 section 5.8.1):
+    every continuation starts on a new line with a single space. Breaks fall
+    between characters, never inside a multi-byte UTF-8 sequence.
+    """
+    if line.isascii():
+        if len(line) <= limit:
+            return line
+        return "\n ".join([line[:limit]] + [line[start:start + limit - 1]
+                                            for start in range(limit, len(line), limit - 1)])
+    if len(line.encode("utf-8")) <= limit:
+        return line
+    parts = []
+    start = 0
+    size = 0
+    # Continuation lines spend one octet on the leading space
+    room = limit
+    for index, char in enumerate(line):
+        width = len(char.encode("utf-8"))
+        if size + width > room:
+            parts.append(line[start:index])
+            start, size, room = index, 0, limit - 1
+        size += width
+    parts.append(line[start:])
+    return "\n ".join(parts)
+
+
+QR_ERROR_CORRECTION = qrcode.constants.ERROR_CORRECT_L
+QR_BOX_SIZE = 10
+QR_BORDER = 2
+QR_FORMATS = ("png", "svg")
+QR_RASTERIZERS = ("pil", "numpy")
+PNG_ENCODERS = ("pil", "lean")
+QR_SEGMENTATIONS = ("qrcode", "optimal")
+# zlib level for the lean PNG encoder: level 7 gets within ~2% of level 9 on
+# QR bitmaps at well under half its cost.
+PNG_ZLIB_LEVEL = 7
+
+DEFAULT_QR_CACHE_BYTES = 256 * 1024 * 1024
+
+
+class QRCodeCache:
+    """
+    Persistent, size-bounded cache of finished QR code data URIs.
+
+    Entries are stored in a SQLite database keyed by a hash of the vCard text
+    and the QR parameters. Once the stored values exceed ``max_bytes``,
+    prune() evicts the least recently used entries first. Each connection
+    prunes after every ``max_bytes / PRUNE_FRACTION`` bytes it stores, so the
+    cache stays bounded during a run. The database can be shared by several
+    processes.
+    """
+
+    SCHEMA_VERSION = 2
+    # Cache hits are remembered in memory and their ``used`` times written in
+    # one transaction per TOUCH_BATCH hits, so processes sharing the database
+    # do not queue for its write lock on every hit. get_qr_cache() writes the
+    # rest when the process exits.
+    TOUCH_BATCH = 256
+    PRUNE_FRACTION = 16
+
+    def __init__(self, path, max_bytes=DEFAULT_QR_CACHE_BYTES):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self._touched = {}
+        self._unpruned_bytes = 0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), timeout=60, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        if self._conn.execute("PRAGMA user_version").fetchone()[0] != self.SCHEMA_VERSION:
+            self._conn.execute("DROP TABLE IF EXISTS qr_codes")
+            self._conn.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS qr_codes ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " version INTEGER NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS qr_codes_used ON qr_codes (used)")
+
+    @staticmethod
+    def make_key(vcard_data, error_correction, box_size, border, output_format="png",
+                 png_encoder="pil", segmentation="qrcode"):
+        """Hash the vCard payload together with the QR parameters."""
+        digest = hashlib.sha256()
+        if output_format == "png" and png_encoder != "pil":
+            output_format = f"{output_format}-{png_encoder}"
+        if segmentation != "qrcode":
+            output_format = f"{output_format}-{segmentation}"
+        params = f"{output_format}:{error_correction}:{box_size}:{border}\n"
+        digest.update(params.encode("ascii"))
+        digest.update(vcard_data.encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(self, key):
+        """
+        Return the cached ``(value, version)`` for ``key`` (marking it as
+        used), or None.
+        """
+        row = self._conn.execute(
+            "SELECT value, version FROM qr_codes WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        self._touched[key] = time.time()
+        if len(self._touched) >= self.TOUCH_BATCH:
+            self.flush()
+        return row[0], row[1]
+
+    def put(self, key, value, version):
+        """Store ``value`` and its QR version under ``key``."""
+        self._conn.execute(
+            "INSERT OR REPLACE INTO qr_codes (key, value, version, size, used)"
+            " VALUES (?, ?, ?, ?, ?)",
+            (key, value, version, len(value), time.time()),
+        )
+        self._unpruned_bytes += len(value)
+        if self._unpruned_bytes > self.max_bytes // self.PRUNE_FRACTION:
+            self.prune()
+
+    def flush(self):
+        """Write the ``used`` times of the hits recorded since the last flush."""
+        if not self._touched:
+            return
+        touched = [(used, key) for key, used in self._touched.items()]
+        self._touched = {}
+        self._conn.execute("BEGIN")
+        try:
+            self._conn.executemany("UPDATE qr_codes SET used = ? WHERE key = ?", touched)
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
+
+    def prune(self):
+        """Evict least recently used entries until the cache fits in max_bytes."""
+        self.flush()
+        self._unpruned_bytes = 0
+        total = 0
+        evict = []
+        rows = self._conn.execute("SELECT key, size FROM qr_codes ORDER BY used DESC")
+        for key, size in rows:
+            total += size
+            if total > self.max_bytes:
+                evict.append((key,))
+        if evict:
+            self._conn.executemany("DELETE FROM qr_codes WHERE key = ?", evict)
+        return len(evict)
+
+    def close(self):
+        """Write pending hits and close the database connection."""
+        self.flush()
+        self._conn.close()
+
+
+# Open QR caches for this process, keyed by database path.
+_QR_CACHES = {}
+
+
+def get_qr_cache(path, max_bytes=DEFAULT_QR_CACHE_BYTES):
+    """Return this process's shared connection to the QR cache at ``path``."""
+    key = str(path)
+    cache = _QR_CACHES.get(key)
+    if cache is None:
+        cache = QRCodeCache(path, max_bytes)
+        _QR_CACHES[key] = cache
+        # Also runs when a pool worker exits, where atexit handlers do not
+        multiprocessing.util.Finalize(cache, cache.flush, exitpriority=10)
+    return cache
+
+
+def qr_modules_to_svg(modules, border=QR_BORDER):
+    """
+    Build inline SVG markup for a QR module matrix.
+    Each horizontal run of dark modules becomes one stroked segment of a
+    single path, using relative moves within a row to keep it compact. The
+    drawing is in module units and scaled to the page by the viewBox.
+    """
+    size = len(modules) + 2 * border
+    parts = []
+    for y, row in enumerate(modules):
+        x = 0
+        width = len(row)
+        pen = None
+        while x < width:
+            if not row[x]:
+                x += 1
+                continue
+            start = x
+            while x < width and row[x]:
+                x += 1
+            if pen is None:
+                parts.append(f"M{start + border} {y + border}.5h{x - start}")
+            else:
+                parts.append(f"m{start - pen} 0h{x - start}")
+            pen = x
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {size} {size}" '
+        f'class="qr-image" role="img" aria-label="vCard QR Code" '
+        f'shape-rendering="crispEdges"><path fill="#fff" d="M0 0h{size}v{size}H0z"/>'
+        f'<path stroke="#000" d="{"".join(parts)}"/></svg>'
+    )
+
+
+# Version ranges that share the same character-count field widths.
+QR_VERSION_CLASSES = ((1, 9), (10, 26), (27, 40))
+
+
+def qr_segment_bits(mode, length, version):
+    """Encoded size in bits of one data segment, including its header."""
+    if mode == qrcode.util.MODE_NUMBER:
+        data_bits = 10 * (length // 3) + (0, 4, 7)[length % 3]
+    elif mode == qrcode.util.MODE_ALPHA_NUM:
+        data_bits = 11 * (length // 2) + 6 * (length % 2)
+    else:
+        data_bits = 8 * length
+    return 4 + qrcode.util.length_in_bits(mode, version) + data_bits
+
+
+def minimal_qr_version(segments, error_correction=QR_ERROR_CORRECTION):
+    """
+    Smallest QR version whose data capacity holds ``segments`` (qrcode
+    QRData chunks), read straight from the capacity table. Returns None if
+    the data does not fit in version 40.
+    """
+    limits = qrcode.util.BIT_LIMIT_TABLE[error_correction]
+    for first, last in QR_VERSION_CLASSES:
+        needed = sum(qr_segment_bits(segment.mode, len(segment), first) for segment in segments)
+        version = bisect_left(limits, needed, first, last + 1)
+        if version <= last:
+            return version
+    return None
+
+
+# Segment modes in the order optimal_qr_segments() considers them, with the
+# cost of one character in each, in sixths of a bit.
+_SEGMENT_MODES = (qrcode.util.MODE_NUMBER, qrcode.util.MODE_ALPHA_NUM,
+                  qrcode.util.MODE_8BIT_BYTE)
+_SEGMENT_CHAR_COSTS = (20, 33, 48)
+_NUMERIC_BYTES = frozenset(b"0123456789")
+_ALPHANUMERIC_BYTES = frozenset(qrcode.util.ALPHA_NUM)
+
+
+def optimal_qr_segments(data, version):
+    """
+    Split ``data`` into numeric, alphanumeric and byte segments with the
+    smallest encoded size at ``version`` (only its character count field
+    widths matter, so one call covers a whole QR_VERSION_CLASSES range).
+
+    Dynamic programming over the UTF-8 bytes: for every byte and mode, keep
+    the cheapest encoding of the prefix that ends in that mode. Costs are in
+    sixths of a bit so numeric (10/3 bits per digit) and alphanumeric (11/2
+    bits per character) stay integral; a segment's cost is rounded up to a
+    whole bit when it ends. Multi-byte characters only ever match byte mode,
+    so segments never split a character.
+    """
+    raw = data.encode("utf-8")
+    headers = [(4 + qrcode.util.length_in_bits(mode, version)) * 6 for mode in _SEGMENT_MODES]
+    costs = list(headers)
+    # came_from[i][m]: mode of byte i on the cheapest path that is in mode m after it
+    came_from = []
+    for byte in raw:
+        allowed = (byte in _NUMERIC_BYTES, byte in _ALPHANUMERIC_BYTES, True)
+        current = [costs[m] + _SEGMENT_CHAR_COSTS[m] if allowed[m] else None
+                   for m in range(3)]
+        modes = [m if allowed[m] else None for m in range(3)]
+        # Switching after this byte: close the segment and pay the next header
+        for to_mode in range(3):
+            for from_mode in range(3):
+                if current[from_mode] is None:
+                    continue
+                switched = -(-current[from_mode] // 6) * 6 + headers[to_mode]
+                if current[to_mode] is None or switched < current[to_mode]:
+                    current[to_mode] = switched
+                    modes[to_mode] = from_mode
+        came_from.append(modes)
+        costs = current
+
+    mode = min(range(3), key=lambda m: -(-costs[m] // 6))
+    byte_modes = [0] * len(raw)
+    for index in range(len(raw) - 1, -1, -1):
+        mode = came_from[index][mode]
+        byte_modes[index] = mode
+
+    segments = []
+    start = 0
+    for index in range(1, len(raw) + 1):
+        if index == len(raw) or byte_modes[index] != byte_modes[start]:
+            segments.append(qrcode.util.QRData(
+                raw[start:index], mode=_SEGMENT_MODES[byte_modes[start]], check_data=False))
+            start = index
+    return segments
+
+
+def optimal_qr_version(data, error_correction=QR_ERROR_CORRECTION):
+    """
+    Smallest QR version for ``data`` with optimal segmentation, as
+    ``(version, segments)``. Returns ``(None, None)`` if it does not fit.
+    """
+    limits = qrcode.util.BIT_LIMIT_TABLE[error_correction]
+    for first, last in QR_VERSION_CLASSES:
+        segments = optimal_qr_segments(data, first)
+        needed = sum(qr_segment_bits(segment.mode, len(segment), first) for segment in segments)
+        version = bisect_left(limits, needed, first, last + 1)
+        if version <= last:
+            return version, segments
+    return None, None
+
+
+def payload_qr_version(data, segmentation="qrcode"):
+    """The QR version make_qr() would pick for ``data``, without encoding it."""
+    if segmentation == "optimal":
+        return optimal_qr_version(data)[0]
+    qr = qrcode.QRCode(error_correction=QR_ERROR_CORRECTION)
+    qr.add_data(data)
+    return minimal_qr_version(qr.data_list, QR_ERROR_CORRECTION)
+
+
+def shorten_url(url):
+    """Drop the query string, fragment and trailing slash from a URL."""
+    url = url.split("#", 1)[0].split("?", 1)[0]
+    return url.rstrip("/") if url.count("/") > 2 else url
+
+
+def fit_payload(card_data, encode, max_version=None, max_bytes=None,
+                trim_order=DEFAULT_TRIM_ORDER, segmentation="qrcode"):
+    """
+    Build the QR payload for ``card_data`` with ``encode`` and make it fit a
+    size budget: at most QR version ``max_version`` and ``max_bytes`` UTF-8
+    bytes. Fields in ``trim_order`` are trimmed one at a time until it fits;
+    URLs are first shortened (see shorten_url()) and only dropped if that is
+    not enough. Returns ``(payload, trimmed)``, where ``trimmed`` lists the
+    dropped fields, with "(shortened)" for a URL that was only shortened.
+    """
+    def fits(payload):
+        if max_bytes is not None and len(payload.encode("utf-8")) > max_bytes:
+            return False
+        if max_version is not None:
+            version = payload_qr_version(payload, segmentation)
+            return version is not None and version <= max_version
+        return True
+
+    payload = encode(card_data)
+    if fits(payload):
+        return payload, []
+    data = dict(card_data)
+    trimmed = []
+    for field in trim_order:
+        if not data.get(field):
+            continue
+        if field in URL_FIELDS:
+            short = shorten_url(str(data[field]))
+            if short != data[field]:
+                data[field] = short
+                payload = encode(data)
+                if fits(payload):
+                    return payload, trimmed + [f"{field} (shortened)"]
+        del data[field]
+        trimmed.append(field)
+        payload = encode(data)
+        if fits(payload):
+            return payload, trimmed
+
+    budget = []
+    if max_version is not None:
+        budget.append(f"QR version {max_version}")
+    if max_bytes is not None:
+        budget.append(f"{max_bytes} bytes")
+    dropped = f" after dropping {', '.join(trimmed)}" if trimmed else ""
+    raise CardError(f"QR payload does not fit in {' / '.join(budget)}{dropped}")
+
+
+def make_qr(vcard_data, segmentation="qrcode"):
+    """
+    Encode vCard data into a QR symbol at the smallest version that fits.
+    The version is computed up front instead of searching upwards with
+    ``make(fit=True)``; the result is the same symbol. With
+    ``segmentation="optimal"`` the data is split by optimal_qr_segments()
+    instead of qrcode's own chunking.
     """
     qr = qrcode.QRCode(
-        version=1,
-        error_correction=qrcode.constants.ERROR_CORRECT_L,
-        box_size=10,
-        border=2,
+        version=None,
+        error_correction=QR_ERROR_CORRECTION,
+        box_size=QR_BOX_SIZE,
+        border=QR_BORDER,
     )
-    qr.add_data(vcard_data)
-    qr.make(fit=True)
+    if segmentation == "optimal":
+        version, segments = optimal_qr_version(vcard_data, QR_ERROR_CORRECTION)
+        for segment in segments or ():
+            qr.add_data(segment)
+    else:
+        qr.add_data(vcard_data)
+        version = minimal_qr_version(qr.data_list, QR_ERROR_CORRECTION)
+    if version is None:
+        raise CardError("vCard is too large to fit in a QR code")
+    qr.version = version
+    qr.make(fit=False)
+    return qr
+
+
+def generate_qr_code(vcard_data, cache=None, output_format="png", rasterizer="pil",
+                     png_encoder="pil", segmentation="qrcode"):
+    """
+    Generate QR code from vCard data and return as base64 data URI.
+    With ``output_format="svg"`` the result is inline SVG markup instead,
+    built straight from the module matrix without rasterizing.
+    ``rasterizer`` picks how PNG pixels are drawn ("pil" or "numpy"); both
+    give the same image. ``png_encoder="lean"`` skips rasterizing altogether
+    and writes a smaller 1-bit PNG straight from the module matrix.
+    ``segmentation`` is passed on to make_qr(). When a QRCodeCache is given,
+    identical payloads are only encoded once.
+    """
+    return encode_qr_code(vcard_data, cache, output_format, rasterizer, png_encoder,
+                          segmentation)[0]
+
+
+def rasterize_qr_numpy(modules, box_size=QR_BOX_SIZE, border=QR_BORDER):
+    """
+    Rasterize a QR module matrix into a 1-bit PIL image with NumPy.
+    Every module is scaled to ``box_size`` pixels with one block-repeat and
+    the quiet zone is added with a single pad, instead of drawing one
+    rectangle per dark module. Pixel-identical to qrcode's PIL image.
+    """
+    dark = numpy.array(modules, dtype=bool)
+    dark = dark.repeat(box_size, axis=0).repeat(box_size, axis=1)
+    dark = numpy.pad(dark, border * box_size, mode="constant", constant_values=False)
+    # Mode "1" stores white as 1, so light pixels are the inverted matrix
+    return Image.fromarray(~dark)
+
+
+def _png_chunk(chunk_type, data):
+    """Frame one PNG chunk: length, type, data and CRC."""
+    crc = zlib.crc32(data, zlib.crc32(chunk_type))
+    return struct.pack(">I", len(data)) + chunk_type + data + struct.pack(">I", crc)
+
+
+def encode_png_1bit(modules, box_size=QR_BOX_SIZE, border=QR_BORDER, level=PNG_ZLIB_LEVEL):
+    """
+    Encode a QR module matrix as a minimal 1-bit grayscale PNG.
+    Only IHDR, IDAT and IEND are written. Each module row is packed once and
+    repeated ``box_size`` times with filter type None: zlib matches the
+    repeats against the previous scanline, which beats both PIL's output and
+    the Up filter on QR bitmaps. Pixel-identical to qrcode's PIL image.
+    """
+    width = (len(modules) + 2 * border) * box_size
+    row_bytes = (width + 7) // 8
+    # Grayscale bit depth 1: 1 is white. Padding bits are ignored by decoders.
+    light_line = b"\x00" + b"\xff" * row_bytes
+    quiet = "1" * (border * box_size)
+    dark_box, light_box = "0" * box_size, "1" * box_size
+    tail = "1" * (row_bytes * 8 - width)
+
+    lines = [light_line] * (border * box_size)
+    packed = {}
+    for row in modules:
+        key = tuple(row)
+        line = packed.get(key)
+        if line is None:
+            bits = quiet + "".join(dark_box if m else light_box for m in row) + quiet + tail
+            line = packed[key] = b"\x00" + int(bits, 2).to_bytes(row_bytes, "big")
+        lines.extend([line] * box_size)
+    lines.extend([light_line] * (border * box_size))
 
-    # Create image
-    img = qr.make_image(fill_color="black", back_color="white")
+    ihdr = struct.pack(">IIBBBBB", width, width, 1, 0, 0, 0, 0)
+    return b"".join((
+        b"\x89PNG\r\n\x1a\n",
+        _png_chunk(b"IHDR", ihdr),
+        _png_chunk(b"IDAT", zlib.compress(b"".join(lines), level)),
+        _png_chunk(b"IEND", b""),
+    ))
 
-    # Convert to base64
+
+def qr_png_bytes(qr, rasterizer="pil", png_encoder="pil"):
+    """Rasterize a made QR symbol and return it as PNG bytes."""
+    if png_encoder == "lean":
+        return encode_png_1bit(qr.modules, qr.box_size, qr.border)
+    if rasterizer == "numpy":
+        img = rasterize_qr_numpy(qr.modules, qr.box_size, qr.border)
+    else:
+        img = qr.make_image(fill_color="black", back_color="white")
     buffered = BytesIO()
     img.save(buffered, format="PNG")
-    img_str = base64.b64encode(buffered.getvalue()).decode()
+    return buffered.getvalue()
+
+
+def encode_qr_code(vcard_data, cache=None, output_format="png", rasterizer="pil",
+                   png_encoder="pil", segmentation="qrcode"):
+    """Like generate_qr_code(), but return ``(qr_code, version)``."""
+    if cache is not None:
+        cache_key = QRCodeCache.make_key(vcard_data, QR_ERROR_CORRECTION, QR_BOX_SIZE,
+                                         QR_BORDER, output_format, png_encoder, segmentation)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+    qr = make_qr(vcard_data, segmentation)
+
+    if output_format == "svg":
+        qr_svg = qr_modules_to_svg(qr.modules, QR_BORDER)
+        if cache is not None:
+            cache.put(cache_key, qr_svg, qr.version)
+        return qr_svg, qr.version
+
+    # Create image and convert to base64
+    img_str = base64.b64encode(qr_png_bytes(qr, rasterizer, png_encoder)).decode("ascii")
 
     # Return as data URI
-    return f"data:image/png;base64,{img_str}"
+    qr_code_uri = f"data:image/png;base64,{img_str}"
+    if cache is not None:
+        cache.put(cache_key, qr_code_uri, qr.version)
+    return qr_code_uri, qr.version
+
+
+_JINJA_TAG = re.compile(r"{{.*?}}|{%.*?%}|{#.*?#}", re.S)
+# Jinja tags are swapped for placeholders while the surrounding markup is
+# minified: \x00N\x00 for {{ }} output, \x01N\x01 for tags that print nothing.
+_JINJA_PLACEHOLDER = re.compile("[\x00\x01]([0-9]+)[\x00\x01]")
+# Set-aside <script>/<style>/<pre>/<textarea> bodies: \x02N\x02
+_RAW_PLACEHOLDER = re.compile("\x02([0-9]+)\x02")
+_HTML_COMMENT = re.compile(r"<!--(?!\[if).*?-->", re.S)
+_HTML_RAW_ELEMENT = re.compile(
+    r"(<(script|style|pre|textarea)\b[^<>]*>)(.*?)(</\2\s*>)", re.S | re.I)
+_HTML_TAG = re.compile(r"<[^<>]+>")
+_HTML_ATTRIBUTE = re.compile(r'(\s[\w:-]+)="([^"]*)"')
+_HTML_UNQUOTED_VALUE = re.compile(r"[A-Za-z0-9_.:#%+-]+\Z")
+# Whitespace (possibly around tags that print nothing) after or before a tag
+_HTML_GAP_AFTER_TAG = re.compile(
+    "(</?(!?[a-zA-Z][\\w-]*)[^<>]*>)((?:\\s|\x01[0-9]+\x01)+)")
+_HTML_GAP_BEFORE_TAG = re.compile(
+    "((?:\\s|\x01[0-9]+\x01)+)(?=</?(!?[a-zA-Z][\\w-]*))")
+# A whitespace run split only by tags that print nothing
+_HTML_SPLIT_GAP = re.compile("(?: ?\x01[0-9]+\x01)+ ?")
+_JINJA_STATEMENT_NAME = re.compile(r"{%[-+]?\s*(\w+)")
+# Elements whose surrounding whitespace never renders, so it can be dropped
+# rather than collapsed to one space.
+_HTML_BLOCK_TAGS = frozenset("""
+    !doctype html head body title meta link style script div p ul ol li dl dt dd table
+    thead tbody tr td th header footer section article aside nav main form h1 h2 h3 h4
+    h5 h6 hr br path rect circle ellipse line polyline polygon g defs
+""".split())
+
 
+def _stash(pattern, text, stash, marker):
+    """Swap every ``pattern`` match for a numbered placeholder kept in ``stash``."""
+    def swap(match):
+        stash.append(match.group(0))
+        return f"{marker(match)}{len(stash) - 1}{marker(match)}"
+    return pattern.sub(swap, text)
 
-def render_template(template_path, output_path, card_data, qr_code_uri):
+
+def _minify_html_tag(match):
+    tag = match.group(0)
+
+    def attribute(attr):
+        name, value = attr.groups()
+        if name.strip().lower() == "style" and "\x00" not in value:
+            value = minify_css(value).rstrip(";")
+        # An unquoted value would swallow the slash of a following "/>"
+        if _HTML_UNQUOTED_VALUE.match(value) and not attr.string.startswith("/", attr.end()):
+            return f"{name}={value}"
+        return f'{name}="{value}"'
+    tag = _HTML_ATTRIBUTE.sub(attribute, tag)
+    return re.sub(r"\s+>\Z", ">", tag)
+
+
+def _merge_split_gap(match, tags):
     """
-    Render the HTML template with card data and QR code.
+    Drop the spaces of a run like `` {% endif %} {% if x %} `` that another
+    kept space makes redundant: one that renders whenever they do, because it
+    sits in the same or an enclosing {% if %} branch with no {% for %} between
+    the two. Runs with statements other than if/for/set are left alone.
+    """
+    parts = re.findall("\x01[0-9]+\x01| ", match.group(0))
+    if parts.count(" ") < 2:
+        return match.group(0)
+    kinds = []
+    for part in parts:
+        if part == " ":
+            kinds.append("space")
+            continue
+        tag = tags[int(part.strip("\x01"))]
+        name = _JINJA_STATEMENT_NAME.match(tag)
+        name = name.group(1) if name else None
+        if tag.startswith("{#") or (name == "set" and "=" in tag):
+            kinds.append(None)
+        elif name in ("if", "for", "endif", "endfor"):
+            kinds.append(name)
+        elif name in ("elif", "else"):
+            kinds.append("branch")
+        else:
+            return match.group(0)
+
+    # The run may close blocks opened before it: start that many levels deep
+    depth = lowest = 0
+    for kind in kinds:
+        depth += {"if": 1, "for": 1, "endif": -1, "endfor": -1}.get(kind, 0)
+        lowest = min(lowest, depth)
+    region_ids = itertools.count()
+    # One [first region, current region] per open block; each branch of a
+    # block is its own region
+    blocks = [[region, region] for region in
+              (next(region_ids) for _ in range(1 - lowest))]
+    loops = set()
+    spaces = []
+    for index, kind in enumerate(kinds):
+        if kind == "space":
+            spaces.append((index, tuple(current for _, current in blocks)))
+        elif kind in ("if", "for"):
+            region = next(region_ids)
+            blocks.append([region, region])
+            if kind == "for":
+                loops.add(region)
+        elif kind == "branch":
+            blocks[-1][1] = next(region_ids)
+        elif kind in ("endif", "endfor"):
+            first, _ = blocks.pop()
+            if kind == "endfor":
+                loops.add(first)
+
+    kept = []
+    for index, path in sorted(spaces, key=lambda space: len(space[1])):
+        if not any(path[:len(other)] == other and not loops.intersection(path[len(other):])
+                   for _, other in kept):
+            kept.append((index, path))
+    kept_indexes = {index for index, _ in kept}
+    return "".join(part for index, part in enumerate(parts)
+                   if part != " " or index in kept_indexes)
+
+
+def _minify_raw_body(match):
+    _, name, body, _ = match.groups()
+    if name.lower() == "style":
+        return minify_css(body)
+    if name.lower() == "script" and "`" not in body:
+        # Only indentation and blank lines go, so automatic semicolon insertion
+        # sees the same line breaks
+        return "\n".join(line.strip() for line in body.splitlines() if line.strip())
+    return body
+
+
+def _is_gap_barrier(placeholder, tags):
+    """
+    True for a placeholder other than an if/elif/else/endif, set or comment
+    tag: whitespace past a {% for %} or {% endfor %} also renders between
+    iterations, so it is not next to the block element.
+    """
+    tag = tags[int(placeholder.strip("\x01"))]
+    name = _JINJA_STATEMENT_NAME.match(tag)
+    name = name.group(1) if name else None
+    return not (tag.startswith("{#") or name in ("if", "elif", "else", "endif", "set"))
+
+
+def _drop_spaces(gap):
+    return "".join(re.findall("\x01[0-9]+\x01", gap))
+
+
+def _drop_gap_after_block(match, tags):
+    tag, name, gap = match.groups()
+    if name.lower() not in _HTML_BLOCK_TAGS:
+        return match.group(0)
+    parts = re.split("(\x01[0-9]+\x01)", gap)
+    for index in range(1, len(parts), 2):
+        if _is_gap_barrier(parts[index], tags):
+            return tag + _drop_spaces("".join(parts[:index])) + "".join(parts[index:])
+    return tag + _drop_spaces(gap)
+
+
+def _drop_gap_before_block(match, tags):
+    gap, name = match.groups()
+    if name.lower() not in _HTML_BLOCK_TAGS:
+        return gap
+    parts = re.split("(\x01[0-9]+\x01)", gap)
+    for index in range(len(parts) - 2, 0, -2):
+        if _is_gap_barrier(parts[index], tags):
+            return "".join(parts[:index + 1]) + _drop_spaces("".join(parts[index + 1:]))
+    return _drop_spaces(gap)
+
+
+def minify_template_source(source, name):
+    """
+    Minify the static parts of a Jinja template, leaving its tags as they
+    are. ``.css`` templates go through minify_css(); anything else is treated
+    as HTML: comments are dropped, whitespace is collapsed (and removed next
+    to block-level elements), attribute quotes are trimmed where HTML allows
+    it, and <style> bodies and style attributes are CSS-minified. <pre> and
+    <textarea> bodies are left alone; <script> bodies only lose indentation.
+    """
+    tags = []
+    text = _stash(_JINJA_TAG, source, tags,
+                  lambda match: "\x00" if match.group(0).startswith("{{") else "\x01")
+    if name.endswith(".css"):
+        text = minify_css(text)
+    else:
+        raw = []
+
+        def set_aside(match):
+            # Bodies that must not be whitespace-collapsed; their tags stay
+            raw.append(_minify_raw_body(match))
+            return f"{match.group(1)}\x02{len(raw) - 1}\x02{match.group(4)}"
+        text = _HTML_COMMENT.sub("", text)
+        text = _HTML_RAW_ELEMENT.sub(set_aside, text)
+        text = re.sub(r"\s+", " ", text)
+        text = _HTML_SPLIT_GAP.sub(lambda match: _merge_split_gap(match, tags), text)
+        text = _HTML_TAG.sub(_minify_html_tag, text)
+        text = _HTML_GAP_AFTER_TAG.sub(lambda match: _drop_gap_after_block(match, tags), text)
+        text = _HTML_GAP_BEFORE_TAG.sub(
+            lambda match: _drop_gap_before_block(match, tags), text).strip()
+        text = _RAW_PLACEHOLDER.sub(lambda match: raw[int(match.group(1))], text)
+    return _JINJA_PLACEHOLDER.sub(lambda match: tags[int(match.group(1))], text)
+
+
+class MinifyingLoader(FileSystemLoader):
+    """
+    FileSystemLoader that hands Jinja minified template sources. Jinja
+    compiles and caches the minified template like any other, so the static
+    markup is minified once per template version and costs nothing per card.
+    """
+
+    def __init__(self, searchpath):
+        super().__init__(searchpath)
+        # (name, source digest) -> minified source, so a reload of unchanged
+        # contents (e.g. after a touch) is not minified again
+        self._minified = {}
+
+    def get_source(self, environment, template):
+        source, filename, uptodate = super().get_source(environment, template)
+        key = (template, hashlib.sha256(source.encode("utf-8")).digest())
+        minified = self._minified.get(key)
+        if minified is None:
+            minified = self._minified[key] = minify_template_source(source, template)
+        return minified, filename, uptodate
+
+
+# One Jinja environment per template directory, per process. The environment
+# keeps compiled templates in memory and only recompiles a template when its
+# file on disk changes (auto_reload compares modification times).
+_TEMPLATE_ENVIRONMENTS = {}
+
+
+def get_template_environment(template_dir, cache_dir=None, minify=False):
     """
-    env = Environment(loader=FileSystemLoader(template_path.parent))
-    template = env.get_template(template_path.name)
+    Return the shared Jinja environment for a template directory.
+    When ``cache_dir`` is given, compiled templates are also kept on disk so
+    new processes can skip the compile step. Jinja checksums the template
+    source, so a cached entry is only used while the file contents match.
+    With ``minify=True`` templates are loaded through MinifyingLoader.
+    """
+    key = (str(template_dir), str(cache_dir) if cache_dir else None, minify)
+    env = _TEMPLATE_ENVIRONMENTS.get(key)
+    if env is None:
+        bytecode_cache = None
+        if cache_dir:
+            bytecode_dir = Path(cache_dir) / ("templates-min" if minify else "templates")
+            bytecode_dir.mkdir(parents=True, exist_ok=True)
+            bytecode_cache = FileSystemBytecodeCache(str(bytecode_dir))
+        loader = MinifyingLoader if minify else FileSystemLoader
+        env = Environment(
+            loader=loader(str(template_dir)),
+            auto_reload=True,
+            bytecode_cache=bytecode_cache,
+        )
+        _TEMPLATE_ENVIRONMENTS[key] = env
+    return env
+
+
+RENDERERS = ("jinja", "skeleton")
+# Write buffer for rendered pages: small chunks are batched into few writes
+RENDER_BUFFER_SIZE = 64 * 1024
+
+# Jinja nodes a template may use for TemplateSkeleton: plain {{ var }}
+# output, {% if %} on variables combined with and/or/not, and static
+# {% include %}s. With only these, the output depends on each variable's
+# text and truthiness and nothing else.
+_SKELETON_NODES = (
+    nodes.Template, nodes.Output, nodes.TemplateData, nodes.Name, nodes.If,
+    nodes.And, nodes.Or, nodes.Not, nodes.Include, nodes.Const,
+)
+_SKELETON_SLOT = re.compile("\x00([0-9]+)\x00")
+
+
+class TemplateSkeleton:
+    """
+    A template pre-split into static byte chunks and value slots.
+
+    Which chunks appear depends on which variables are truthy, so a layout
+    is built the first time each combination is seen: Jinja renders the
+    template once with a numbered sentinel in place of every truthy value
+    (falsy values are rendered as they are, since they can only print as
+    themselves), and the output is split at the sentinels. A card is then
+    one join of pre-encoded chunks and values, escaped exactly as the
+    environment would escape them.
+    """
+
+    def __init__(self, env, sources, variables):
+        self.env = env
+        # (name, Template) for the template and everything it includes
+        self.sources = sources
+        self.template = sources[0][1]
+        # Variable names in slot order, or None if the template needs Jinja
+        self.variables = variables
+        autoescape = env.autoescape
+        if callable(autoescape):
+            autoescape = autoescape(self.template.name)
+        self.autoescape = autoescape
+        self._layouts = {}
+
+    @classmethod
+    def build(cls, env, name):
+        """
+        Load the template ``name`` and its includes. Its ``variables`` are
+        None unless they only use the constructs in _SKELETON_NODES.
+        """
+        variables = set()
+        sources = []
+        pending = [name]
+        while pending:
+            current = pending.pop()
+            if any(current == seen for seen, _ in sources):
+                continue
+            sources.append((current, env.get_template(current)))
+            source = env.loader.get_source(env, current)[0]
+            for node in env.parse(source).find_all(nodes.Node):
+                if not isinstance(node, _SKELETON_NODES):
+                    return cls(env, tuple(sources), None)
+                if isinstance(node, nodes.Name):
+                    variables.add(node.name)
+                elif isinstance(node, nodes.Include):
+                    if not isinstance(node.template, nodes.Const) or node.ignore_missing:
+                        return cls(env, tuple(sources), None)
+                    pending.append(node.template.value)
+        return cls(env, tuple(sources), tuple(sorted(variables)))
+
+    def is_current(self):
+        """False once Jinja has reloaded the template or one of its includes."""
+        return all(self.env.get_template(name) is template for name, template in self.sources)
+
+    def _layout(self, context):
+        key = []
+        sentinels = {}
+        for index, name in enumerate(self.variables):
+            if name not in context:
+                key.append(None)
+                continue
+            value = context[name]
+            if value:
+                key.append(True)
+                sentinels[name] = f"\x00{index}\x00"
+            else:
+                key.append((False, str(value)))
+                sentinels[name] = value
+        key = tuple(key)
+        layout = self._layouts.get(key)
+        if layout is None:
+            parts = _SKELETON_SLOT.split(self.template.render(**sentinels))
+            layout = [part.encode("utf-8") for part in parts[::2]]
+            for position, index in enumerate(parts[1::2]):
+                layout.insert(2 * position + 1, self.variables[int(index)])
+            self._layouts[key] = layout
+        return layout
+
+    def generate(self, context):
+        """Render ``context`` (variable name -> value) as UTF-8 byte chunks."""
+        layout = self._layout(context)
+        yield layout[0]
+        for index in range(1, len(layout), 2):
+            value = context[layout[index]]
+            text = str(html_escape(value)) if self.autoescape else str(value)
+            yield text.encode("utf-8")
+            yield layout[index + 1]
+
+    def render(self, context):
+        """Render ``context`` (variable name -> value) to UTF-8 bytes."""
+        return b"".join(self.generate(context))
+
+
+# Skeletons for this process, keyed by (environment, template name).
+_TEMPLATE_SKELETONS = {}
+
+
+def get_template_skeleton(env, name):
+    """
+    Return the TemplateSkeleton for template ``name``, rebuilding it when
+    the template or an include changed, or None if it needs Jinja.
+    """
+    skeleton = _TEMPLATE_SKELETONS.get((env, name))
+    if skeleton is None or not skeleton.is_current():
+        skeleton = _TEMPLATE_SKELETONS[(env, name)] = TemplateSkeleton.build(env, name)
+    return skeleton if skeleton.variables is not None else None
+
+
+# The stylesheet template card.html inlines, or links in --stylesheet external mode.
+STYLESHEET_TEMPLATE = "styles.css"
+STYLESHEET_MODES = ("inline", "external")
+
+_CSS_STRING_OR_COMMENT = re.compile(r"""("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*'|/\*.*?\*/)""", re.S)
+
+
+def minify_css(css):
+    """
+    Minify a stylesheet: drop comments, collapse whitespace and remove it
+    around braces, semicolons, commas, child combinators and after colons.
+    Quoted strings are kept as they are.
+    """
+    out = []
+    for index, part in enumerate(_CSS_STRING_OR_COMMENT.split(css)):
+        if index % 2:
+            if not part.startswith("/*"):
+                out.append(part)
+            continue
+        part = re.sub(r"\s+", " ", part)
+        part = re.sub(r" ?([{};,>]) ?", r"\1", part)
+        out.append(part.replace(": ", ":").replace(";}", "}"))
+    return "".join(out).strip()
+
 
-    html_content = template.render(
+def write_stylesheet(template_path, output_dir, cache_dir=None):
+    """
+    Write the minified stylesheet next to the cards as ``styles.<hash>.css``
+    and return its file name and size. The name changes with the contents,
+    so the file can be cached forever; an existing file is left untouched.
+    """
+    env = get_template_environment(template_path.parent, cache_dir)
+    css = minify_css(env.get_template(STYLESHEET_TEMPLATE).render()).encode("utf-8")
+    name = f"styles.{hashlib.sha256(css).hexdigest()[:12]}.css"
+    path = Path(output_dir) / name
+    if not path.exists():
+        path.write_bytes(css)
+    return name, len(css)
+
+
+# Settings for the --precompress sidecars. Both are the slowest, smallest
+# settings: a sidecar is only compressed when its page changes, and is then
+# served many times.
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 11
+
+
+def sidecar_suffixes():
+    """Sidecars --precompress writes: ``.gz``, plus ``.br`` when brotli is installed."""
+    return (".gz", ".br") if brotli is not None else (".gz",)
+
+
+def compress_sidecar(data, suffix):
+    """Compress ``data`` for a ``.gz`` or ``.br`` sidecar."""
+    if suffix == ".br":
+        return brotli.compress(data, mode=brotli.MODE_TEXT, quality=BROTLI_QUALITY)
+    # mtime=0 keeps the output reproducible
+    return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def file_state(path):
+    """``(SHA-256 digest, mtime in ns)`` of ``path``, or None if it does not exist."""
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    return file_digest(path), mtime
+
+
+def write_sidecars(path, suffixes, previous=None):
+    """
+    Write a precompressed copy of ``path`` next to it for each suffix, for
+    servers that serve them directly (nginx gzip_static/brotli_static).
+    ``previous`` is the file_state() of ``path`` before it was rewritten: if
+    the contents are unchanged, sidecars written after that version are kept
+    rather than compressed again. Returns ``({suffix: size}, kept)``.
+    """
+    path = Path(path)
+    data = path.read_bytes()
+    unchanged = previous is not None and previous[0] == hashlib.sha256(data).hexdigest()
+    sizes = {}
+    kept = 0
+    for suffix in suffixes:
+        sidecar = path.with_name(path.name + suffix)
+        if unchanged:
+            try:
+                stat = sidecar.stat()
+            except FileNotFoundError:
+                stat = None
+            if stat is not None and stat.st_mtime_ns >= previous[1]:
+                # Keep it newer than the page it was just checked against
+                os.utime(sidecar)
+                sizes[suffix] = stat.st_size
+                kept += 1
+                continue
+        compressed = compress_sidecar(data, suffix)
+        sidecar.write_bytes(compressed)
+        sizes[suffix] = len(compressed)
+    return sizes, kept
+
+
+def render_template(template_path, output_path, card_data, qr_code_uri, cache_dir=None,
+                    qr_svg=None, renderer="jinja", stylesheet_href=None, minify=False):
+    """
+    Render the HTML template with card data and QR code.
+    Pass ``qr_svg`` to inline SVG markup instead of the ``qr_code_uri`` image,
+    and ``stylesheet_href`` to link a shared stylesheet instead of inlining it.
+    With ``renderer="skeleton"`` the page is assembled from a
+    TemplateSkeleton when the template allows it; the output is the same.
+    Either way the page is streamed chunk by chunk into a buffered binary
+    file, so it is never held in memory as a whole. The file is a temporary
+    one that replaces ``output_path`` only once the page is complete, so a
+    template error never leaves a truncated page behind. ``minify=True``
+    renders from minified templates (see MinifyingLoader). Returns the number
+    of bytes written.
+    """
+    env = get_template_environment(template_path.parent, cache_dir, minify)
+    context = dict(
         name=card_data.get('name', 'Unknown'),
         title=card_data.get('title'),
         company=card_data.get('company'),
@@ -138,88 +1274,1062 @@ def render_template(template_path, output_path, card_data, qr_code_uri):
         github=card_data.get('github'),
         twitter=card_data.get('twitter'),
         qr_code=qr_code_uri,
+        qr_svg=qr_svg,
+        stylesheet_href=stylesheet_href,
     )
 
-    with open(output_path, 'w', encoding='utf-8') as f:
-        f.write(html_content)
+    skeleton = None
+    if renderer == "skeleton":
+        skeleton = get_template_skeleton(env, template_path.name)
+    if skeleton is not None:
+        chunks = skeleton.generate(context)
+    else:
+        chunks = (chunk.encode("utf-8")
+                  for chunk in env.get_template(template_path.name).generate(**context))
+
+    output_path = Path(output_path)
+    # Per process, in case two cards with the same key share a page
+    tmp_path = output_path.with_name(f"{output_path.name}.{os.getpid()}.tmp")
+    try:
+        with open(tmp_path, 'wb', buffering=RENDER_BUFFER_SIZE) as f:
+            f.writelines(chunks)
+            size = f.tell()
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+    return size
 
 
 def slugify_name(value):
     """Normalize a string for use as a filename."""
     if not value:
         return ""
-    text = str(value).lower()
+    # Fold accented letters to their ASCII base ("José" -> "jose") rather
+    # than dropping them, which keeps names distinct and collisions rare.
+    text = unicodedata.normalize("NFKD", str(value))
+    text = text.encode("ascii", "ignore").decode("ascii").lower()
     text = re.sub(r"[^a-z0-9 _]+", "", text)
     text = text.replace(" ", "_")
     text = re.sub(r"_+", "_", text).strip("_")
     return text
 
 
-def choose_output_path(output_dir, base_name):
-    """Choose a non-colliding output path using numeric suffixes."""
-    output_path = output_dir / f"{base_name}.html"
-    if not output_path.exists():
-        return output_path
+class OutputNameRegistry:
+    """
+    Hands out non-colliding output paths without probing the filesystem.
+
+    A base name gets ``<name>.html`` if that is free, and otherwise
+    ``<name>-N.html`` with the lowest free N from 2 up. The output directory
+    is scanned once up front, and paths that are not written yet can be
+    reserved; after that every claim is an in-memory, amortised O(1)
+    operation. Claims are made in input order by the main process, so names
+    stay deterministic when cards are built in parallel.
+    """
+
+    _SUFFIX_RE = re.compile(r"^(.+)-([0-9]+)$")
+
+    def __init__(self, output_dir):
+        self.output_dir = Path(output_dir)
+        self._taken = {}
+        self._next = {}
+        if self.output_dir.is_dir():
+            with os.scandir(self.output_dir) as entries:
+                for entry in entries:
+                    if entry.name.endswith(".html"):
+                        self._mark(entry.name[:-len(".html")])
+
+    def _mark(self, stem):
+        match = self._SUFFIX_RE.match(stem)
+        if match and int(match.group(2)) >= 2:
+            base_name, index = match.group(1), int(match.group(2))
+        else:
+            base_name, index = stem, 1
+        self._taken.setdefault(base_name, set()).add(index)
+
+    def reserve(self, output_path):
+        """Mark ``output_path`` as taken even if it does not exist yet."""
+        name = Path(output_path).name
+        if name.endswith(".html"):
+            self._mark(name[:-len(".html")])
+
+    def claim(self, base_name):
+        """Return the next free output path for ``base_name`` and take it."""
+        taken = self._taken.setdefault(base_name, set())
+        index = self._next.get(base_name, 1)
+        while index in taken:
+            index += 1
+        taken.add(index)
+        self._next[base_name] = index + 1
+        if index == 1:
+            return self.output_dir / f"{base_name}.html"
+        return self.output_dir / f"{base_name}-{index}.html"
+
+
+class StageTimer:
+    """
+    Records wall-clock and CPU seconds for each pipeline stage of one card,
+    plus per-card metrics such as the QR version and the fields trimmed from
+    the QR payload.
+    """
+
+    def __init__(self):
+        self.timings = {}
+        self.metrics = {}
+        self.trimmed = []
+
+    @contextmanager
+    def stage(self, name):
+        """Time the enclosed block as stage ``name``."""
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            self.timings[name] = (time.perf_counter() - wall, time.process_time() - cpu)
+
+
+def build_card(card_data, output_path, options, timer=None):
+    """
+    Generate the vCard, QR code and HTML page for a single card.
+    Stage timings are recorded on ``timer`` if one is given.
+    """
+    timer = timer if timer is not None else StageTimer()
+    with timer.stage("vcard"):
+        encode = VCARD_FORMATS[options.vcard_format]
+        if options.vcard_fold:
+            encode = partial(encode, fold=True)
+        vcard, timer.trimmed = fit_payload(
+            card_data, encode,
+            options.max_qr_version, options.max_payload_bytes, options.trim_order,
+            options.qr_segmentation)
+        timer.metrics["payload_bytes"] = len(vcard.encode("utf-8"))
+        if options.vcard_format != "full" or timer.trimmed:
+            # Baseline for the savings report: the full vCard's size and version
+            full_vcard = generate_vcard(card_data, fold=options.vcard_fold)
+            timer.metrics["payload_bytes_full"] = len(full_vcard.encode("utf-8"))
+            timer.metrics["qr_version_full"] = (
+                payload_qr_version(full_vcard, options.qr_segmentation) or 0)
+    with timer.stage("qr"):
+        qr_cache = None
+        if options.qr_cache_size > 0:
+            qr_cache = get_qr_cache(qr_cache_path(options), options.qr_cache_size)
+        qr_code, timer.metrics["qr_version"] = encode_qr_code(
+            vcard, cache=qr_cache, output_format=options.qr_format,
+            rasterizer=options.qr_rasterizer, png_encoder=options.png_encoder,
+            segmentation=options.qr_segmentation)
+        if options.qr_segmentation != "qrcode":
+            # Versions saved compared with qrcode's own chunking of the same
+            # payload; when that does not fit at all, count it as version 41
+            timer.metrics["segmentation_versions_saved"] = (
+                (payload_qr_version(vcard) or 41) - timer.metrics["qr_version"])
+        if "qr_version_full" not in timer.metrics:
+            timer.metrics["payload_bytes_full"] = timer.metrics["payload_bytes"]
+            timer.metrics["qr_version_full"] = timer.metrics["qr_version"]
+    with timer.stage("render"):
+        # The page being replaced, so unchanged pages keep their sidecars
+        previous = file_state(output_path) if options.precompress_suffixes else None
+        qr_uri, qr_svg = (None, qr_code) if options.qr_format == "svg" else (qr_code, None)
+        timer.metrics["output_bytes"] = render_template(
+            options.template, output_path, card_data, qr_uri, cache_dir=options.cache_dir,
+            qr_svg=qr_svg, renderer=options.renderer,
+            stylesheet_href=options.stylesheet_href, minify=options.minify)
+    if options.precompress_suffixes:
+        with timer.stage("compress"):
+            sizes, timer.metrics["sidecars_kept"] = write_sidecars(
+                output_path, options.precompress_suffixes, previous)
+            timer.metrics["gzip_bytes"] = sizes.get(".gz", 0)
+            timer.metrics["brotli_bytes"] = sizes.get(".br", 0)
+    return output_path
+
+
+class RunStats:
+    """
+    Per-stage timings and per-card metrics for every card built in a run,
+    plus run totals. Metrics are kept as running totals and histograms; only
+    the wall times, which the percentiles need, are kept per card, in compact
+    arrays (40 bytes per card). With ``json_path`` each card's numbers are
+    written to that file as the card is recorded rather than held in memory.
+    """
+
+    STAGES = ("load", "vcard", "qr", "render", "compress")
+    METRICS = ("qr_version", "qr_version_full", "payload_bytes", "payload_bytes_full",
+               "segmentation_versions_saved", "output_bytes", "gzip_bytes", "brotli_bytes",
+               "sidecars_kept")
+    # Metrics summarised as a count of cards per value rather than a total
+    HISTOGRAMS = ("qr_version", "qr_version_full")
+    PERCENTILES = (50, 95, 99)
+
+    def __init__(self, json_path=None):
+        self.started = time.perf_counter()
+        self.finished = None
+        self.cards = 0
+        self.wall = {stage: array('d') for stage in self.STAGES}
+        self.cpu = {stage: 0.0 for stage in self.STAGES}
+        self.totals = {metric: 0 for metric in self.METRICS}
+        self.histograms = {metric: {} for metric in self.HISTOGRAMS}
+        self.versions_reduced = 0
+        self.segmentation_cards_reduced = 0
+        self.trimmed_cards = 0
+        # Field -> number of cards it was trimmed from
+        self.trimmed = {}
+        self._json = None
+        if json_path is not None:
+            self._json = open(json_path, 'w', encoding='utf-8')
+            self._json.write('{"cards": [')
+
+    def record(self, source, timer):
+        """Record the stage timings and metrics of one card's StageTimer."""
+        stages = {}
+        for stage in self.STAGES:
+            wall, cpu = timer.timings.get(stage, (0.0, 0.0))
+            self.wall[stage].append(wall)
+            self.cpu[stage] += cpu
+            stages[stage] = {"wall": wall, "cpu": cpu}
+        metrics = {metric: timer.metrics.get(metric, 0) for metric in self.METRICS}
+        for metric, value in metrics.items():
+            self.totals[metric] += value
+        for metric in self.HISTOGRAMS:
+            counts = self.histograms[metric]
+            counts[metrics[metric]] = counts.get(metrics[metric], 0) + 1
+        if metrics["qr_version"] != metrics["qr_version_full"]:
+            self.versions_reduced += 1
+        if metrics["segmentation_versions_saved"]:
+            self.segmentation_cards_reduced += 1
+        if timer.trimmed:
+            self.trimmed_cards += 1
+            for field in timer.trimmed:
+                self.trimmed[field] = self.trimmed.get(field, 0) + 1
+        if self._json is not None:
+            entry = {"source": str(source), "stages": stages, "metrics": metrics,
+                     "trimmed": list(timer.trimmed)}
+            self._json.write(("\n" if not self.cards else ",\n") + json.dumps(entry))
+        self.cards += 1
+
+    def histogram(self, metric):
+        """Count of cards per value of ``metric``."""
+        return dict(sorted(self.histograms[metric].items()))
+
+    def trimmed_fields(self):
+        """Count of cards per field trimmed from the QR payload."""
+        return dict(sorted(self.trimmed.items()))
+
+    def finish(self):
+        """Mark the end of the run."""
+        self.finished = time.perf_counter()
+
+    @property
+    def elapsed(self):
+        end = self.finished if self.finished is not None else time.perf_counter()
+        return end - self.started
+
+    @staticmethod
+    def percentile(sorted_values, percent):
+        """Nearest-rank percentile of an already sorted sequence."""
+        if not sorted_values:
+            return 0.0
+        rank = max(1, math.ceil(percent / 100 * len(sorted_values)))
+        return sorted_values[rank - 1]
+
+    def summary(self):
+        """Per-stage percentiles and totals, plus overall throughput."""
+        stages = {}
+        for stage in self.STAGES:
+            values = sorted(self.wall[stage])
+            stages[stage] = {
+                f"p{percent}": self.percentile(values, percent) for percent in self.PERCENTILES
+            }
+            stages[stage]["wall_total"] = math.fsum(values)
+            stages[stage]["cpu_total"] = self.cpu[stage]
+        cards = self.cards
+        elapsed = self.elapsed
+        totals = self.totals
+        return {
+            "cards": cards,
+            "elapsed": elapsed,
+            "cards_per_second": cards / elapsed if elapsed > 0 else 0.0,
+            "stages": stages,
+            "qr_versions": self.histogram("qr_version"),
+            "qr_versions_full": self.histogram("qr_version_full"),
+            "payload": {
+                "bytes": totals["payload_bytes"],
+                "bytes_full": totals["payload_bytes_full"],
+                "bytes_saved": totals["payload_bytes_full"] - totals["payload_bytes"],
+                "trimmed_cards": self.trimmed_cards,
+                "trimmed_fields": self.trimmed_fields(),
+                "versions_reduced": self.versions_reduced,
+            },
+            "output_bytes": totals["output_bytes"],
+            "sidecars": {
+                "gzip_bytes": totals["gzip_bytes"],
+                "brotli_bytes": totals["brotli_bytes"],
+                "kept": totals["sidecars_kept"],
+            },
+            "segmentation": {
+                "cards_reduced": self.segmentation_cards_reduced,
+                "versions_saved": totals["segmentation_versions_saved"],
+            },
+        }
+
+    def print_summary(self):
+        """Print a human readable timing table."""
+        summary = self.summary()
+        print(f"⏱️  {summary['cards']} card(s) in {summary['elapsed']:.2f}s "
+              f"({summary['cards_per_second']:.1f} cards/sec)")
+        if not summary["cards"]:
+            return
+        print(f"   {'stage':<8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+              f"{'wall s':>10}{'cpu s':>10}")
+        for stage, values in summary["stages"].items():
+            if not values["wall_total"]:
+                # A stage this run did not use, such as compress without --precompress
+                continue
+            print(f"   {stage:<8}{values['p50'] * 1000:>10.2f}{values['p95'] * 1000:>10.2f}"
+                  f"{values['p99'] * 1000:>10.2f}{values['wall_total']:>10.2f}"
+                  f"{values['cpu_total']:>10.2f}")
+        versions = ", ".join(
+            f"v{version}: {count}" for version, count in summary["qr_versions"].items()
+        )
+        print(f"🔳 QR versions: {versions}")
+        print(f"💾 Output: {summary['output_bytes']:,} bytes in {summary['cards']} page(s) "
+              f"({summary['output_bytes'] / summary['cards']:,.0f} bytes/page)")
+        sidecars = summary["sidecars"]
+        if sidecars["gzip_bytes"]:
+            sizes = f".gz {sidecars['gzip_bytes']:,} bytes"
+            if sidecars["brotli_bytes"]:
+                sizes += f", .br {sidecars['brotli_bytes']:,} bytes"
+            print(f"🗜️  Sidecars: {sizes} ({sidecars['kept']} unchanged, not recompressed)")
+        segmentation = summary["segmentation"]
+        if segmentation["versions_saved"]:
+            print(f"🧩 Optimal segmentation saved {segmentation['versions_saved']} QR "
+                  f"version(s) on {segmentation['cards_reduced']} card(s)")
+        payload = summary["payload"]
+        if payload["bytes_saved"]:
+            versions_full = ", ".join(
+                f"v{version}: {count}" for version, count in summary["qr_versions_full"].items()
+            )
+            print(f"   (full vCard: {versions_full})")
+            print(f"📦 Payload: {payload['bytes_saved']} byte(s) saved "
+                  f"({payload['bytes_saved'] / payload['bytes_full']:.1%}), "
+                  f"QR version lowered on {payload['versions_reduced']} card(s)")
+        if payload["trimmed_cards"]:
+            fields = ", ".join(
+                f"{field}: {count}" for field, count in payload["trimmed_fields"].items()
+            )
+            print(f"✂️  Trimmed {payload['trimmed_cards']} card(s) to fit the QR budget ({fields})")
+
+    def write_json(self):
+        """Finish the ``json_path`` file: close the card list and add the summary."""
+        self._json.write("\n],\n\"summary\": ")
+        json.dump(self.summary(), self._json, indent=2)
+        self._json.write("}\n")
+        self._json.close()
+        self._json = None
+
+
+def qr_cache_path(options):
+    """Location of the QR code cache database."""
+    return Path(options.cache_dir) / "qr-codes.sqlite"
+
+
+# Build options for the current process, set by init_worker() in the main
+# process (serial runs) or in each pool worker.
+_BUILD_OPTIONS = None
+
+
+def init_worker(options):
+    """Store the build options for this process."""
+    global _BUILD_OPTIONS
+    _BUILD_OPTIONS = options
+
+
+# A card ready to build: where it came from, its manifest key, the loaded
+# data, the assigned output path, the input hash and the load timing.
+CardJob = namedtuple(
+    "CardJob", "source key card_data output_path input_hash load_timing"
+)
+
+
+def _build_card_job(job):
+    """
+    Worker entry point: build one card and return
+    ``(output_path, timer, error)``. Failures are returned as an error
+    message rather than raised, so one bad card cannot stop the batch.
+    """
+    timer = StageTimer()
+    timer.timings["load"] = job.load_timing
+    try:
+        output_path = build_card(job.card_data, job.output_path, _BUILD_OPTIONS, timer)
+    except CardError as e:
+        return None, timer, str(e)
+    except TemplateError as e:
+        return None, timer, f"Template error: {e}"
+    except OSError as e:
+        return None, timer, f"Could not write output: {e}"
+    except Exception as e:
+        return None, timer, f"Unexpected {type(e).__name__}: {e}"
+    return output_path, timer, None
+
+
+def file_digest(path):
+    """Return the SHA-256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# Command line options that change the generated HTML.
+FINGERPRINT_OPTIONS = ("qr_format", "png_encoder", "vcard_format", "max_qr_version",
+                       "max_payload_bytes", "trim_order", "qr_segmentation", "vcard_fold",
+                       "stylesheet", "minify", "precompress_suffixes")
+
+
+def build_fingerprint(options):
+    """
+    Fingerprint everything besides the card data that affects the output:
+    which template is rendered, the contents of every file in the template
+    directory and the options listed in FINGERPRINT_OPTIONS.
+    """
+    digest = hashlib.sha256()
+    for name in FINGERPRINT_OPTIONS:
+        digest.update(f"{name}={getattr(options, name)}\0".encode("utf-8"))
+    # The name rather than the path, so the same template given as a relative
+    # or an absolute path keeps its fingerprint
+    digest.update(f"template={Path(options.template).name}\0".encode("utf-8"))
+    template_dir = Path(options.template).parent
+    for path in sorted(template_dir.iterdir()):
+        if path.is_file():
+            digest.update(path.name.encode("utf-8") + b"\0")
+            digest.update(path.read_bytes() + b"\0")
+    return digest.hexdigest()
+
+
+class BuildManifest:
+    """
+    Record of the last incremental build: for each input file, the hash of
+    its contents, the build fingerprint and the output file it produced.
+    Stored as JSON in the output directory.
+    """
+
+    FILENAME = ".bcard-manifest.json"
+    FORMAT_VERSION = 1
+
+    def __init__(self, path, entries=None):
+        self.path = Path(path)
+        self.entries = entries or {}
+        self.seen = set()
+        self.skipped = 0
+
+    @classmethod
+    def load(cls, output_dir):
+        """Load the manifest from ``output_dir``, or start an empty one."""
+        path = Path(output_dir) / cls.FILENAME
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return cls(path)
+        if data.get("version") != cls.FORMAT_VERSION:
+            return cls(path)
+        return cls(path, data.get("cards", {}))
+
+    def output_path(self, key, output_dir):
+        """Output path recorded for ``key``, or None for a new input."""
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        return Path(output_dir) / entry["output"]
+
+    def is_current(self, key, input_hash, fingerprint, output_dir):
+        """True if ``key`` was built from the same input and fingerprint."""
+        self.seen.add(key)
+        entry = self.entries.get(key)
+        if entry is None:
+            return False
+        return (
+            entry["input_hash"] == input_hash
+            and entry["fingerprint"] == fingerprint
+            and (Path(output_dir) / entry["output"]).exists()
+        )
+
+    def record(self, key, input_hash, fingerprint, output_path):
+        """Record a freshly built card."""
+        self.seen.add(key)
+        self.entries[key] = {
+            "input_hash": input_hash,
+            "fingerprint": fingerprint,
+            "output": Path(output_path).name,
+        }
+
+    def save(self):
+        """Write the manifest, dropping inputs that no longer exist."""
+        cards = {key: self.entries[key] for key in sorted(self.seen) if key in self.entries}
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"version": self.FORMAT_VERSION, "cards": cards}, f)
+        os.replace(tmp_path, self.path)
+
+
+def iter_json_file_records(json_paths):
+    """
+    Yield a card record per JSON file:
+    ``(source, key, input_hash, fallback_name, load)``, where ``load()``
+    returns the card data.
+    """
+    for json_path in json_paths:
+        try:
+            input_hash = file_digest(json_path)
+        except OSError:
+            # Missing or unreadable: load() reports it as a failed card
+            input_hash = None
+        yield (json_path, json_path.name, input_hash, json_path.stem,
+               partial(load_business_card, json_path))
+
+
+def iter_json_dir_records(input_dir):
+    """
+    Stream a card record per ``*.json`` file in ``input_dir`` using
+    os.scandir(), in directory order and without building or sorting a list
+    of paths, so the first cards are ready immediately and memory stays flat
+    however large the directory is. See iter_json_file_records().
+    """
+    with os.scandir(input_dir) as entries:
+        for entry in entries:
+            if entry.name.endswith(".json") and entry.is_file():
+                yield from iter_json_file_records([Path(entry.path)])
+
+
+def iter_prefetched(iterable, maxsize=256):
+    """
+    Run ``iterable`` on a background thread and yield its items through a
+    bounded queue, overlapping directory scanning and file reads with the
+    rest of the pipeline. At most ``maxsize`` items are buffered.
+    """
+    queue = Queue(maxsize=maxsize)
+    done = object()
+
+    def produce():
+        try:
+            for item in iterable:
+                queue.put((item, None))
+        except BaseException as e:
+            queue.put((done, e))
+        else:
+            queue.put((done, None))
 
-    index = 2
+    threading.Thread(target=produce, daemon=True).start()
     while True:
-        candidate = output_dir / f"{base_name}-{index}.html"
-        if not candidate.exists():
-            return candidate
-        index += 1
+        item, error = queue.get()
+        if item is done:
+            if error is not None:
+                raise error
+            return
+        yield item
 
 
-def main():
-    """Main entry point."""
-    # Define paths
+def iter_jsonl_records(jsonl_path, failures=None):
+    """
+    Yield a card record per line of a JSON Lines file, or of stdin when
+    ``jsonl_path`` is ``-``. See iter_json_file_records().
+
+    A line's position says nothing about which card it holds, so records are
+    keyed by the card's ``id`` field, or failing that by the hash of the line.
+    The manifest, the journal and stable naming then follow the card when
+    lines are inserted, removed or reordered. Without an ``id`` an edited
+    card is a new card and gets a new page.
+    """
+    if str(jsonl_path) == "-":
+        stream, name, stem = sys.stdin.buffer, "<stdin>", "stdin"
+    else:
+        stream, name, stem = open(jsonl_path, 'rb'), str(jsonl_path), Path(jsonl_path).stem
+    try:
+        for line_number, data, input_hash in iter_jsonl_cards(stream, name, failures):
+            card_id = data.get('id')
+            if card_id is None or card_id == "":
+                key = f"{Path(name).name}#{input_hash}"
+            else:
+                key = f"{Path(name).name}@{card_id}"
+            yield (f"{name}:{line_number}", key,
+                   input_hash, f"{stem}_{line_number}", partial(dict, data))
+    finally:
+        if stream is not sys.stdin.buffer:
+            stream.close()
+
+
+class BuildJournal:
+    """
+    Append-only journal of the run in progress, used to resume after an
+    interruption.
+
+    Each line is a small JSON array. A card's output path is journaled when
+    it is assigned ("claim") and the card is journaled again once written
+    ("done"). A restarted run skips finished cards and sends unfinished ones
+    back to the path they already claimed, so no duplicate ``-N`` files
+    appear. Lines are flushed as they are written and fsync'ed in batches;
+    a torn final line is ignored on load. The journal is removed when a run
+    completes.
+    """
+
+    FILENAME = ".bcard-journal"
+    SYNC_EVERY = 1000
+
+    def __init__(self, output_dir, fingerprint):
+        self.path = Path(output_dir) / self.FILENAME
+        self.fingerprint = fingerprint
+        self.claims = {}
+        self.done = set()
+        self.resumed = 0
+        self._file = None
+        self._unsynced = 0
+        self._load()
+
+    def _load(self):
+        try:
+            f = open(self.path, 'r', encoding='utf-8')
+        except FileNotFoundError:
+            return
+        with f:
+            fingerprint = None
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if entry[0] == "start":
+                    fingerprint = entry[1]
+                elif entry[0] == "claim":
+                    self.claims[entry[1]] = (entry[2], entry[3])
+                elif entry[0] == "done" and fingerprint == self.fingerprint:
+                    # Cards finished under different templates must be rebuilt
+                    self.done.add(entry[1])
+
+    @property
+    def interrupted(self):
+        """True if an earlier run left this journal behind."""
+        return bool(self.claims)
+
+    def claimed_path(self, key, output_dir):
+        """Output path claimed for ``key`` by an earlier run, or None."""
+        claim = self.claims.get(key)
+        if claim is None:
+            return None
+        return Path(output_dir) / claim[1]
+
+    def is_done(self, key, input_hash, output_dir):
+        """True if ``key`` was finished from the same input by an earlier run."""
+        claim = self.claims.get(key)
+        return (
+            key in self.done
+            and claim[0] == input_hash
+            and (Path(output_dir) / claim[1]).exists()
+        )
+
+    def open(self):
+        """Start appending entries for this run."""
+        self._file = open(self.path, 'a', encoding='utf-8')
+        self._write(["start", self.fingerprint])
+
+    def claim(self, key, input_hash, output_path):
+        """
+        Journal the output path assigned to ``key``. Only the file records
+        it: ``claims`` holds what an earlier run left behind, so this run's
+        claims do not accumulate in memory.
+        """
+        self._write(["claim", key, input_hash, Path(output_path).name])
+
+    def complete(self, key):
+        """Journal that ``key`` has been written."""
+        self._write(["done", key])
+
+    def _write(self, entry):
+        self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._file.flush()
+        self._unsynced += 1
+        if self._unsynced >= self.SYNC_EVERY:
+            os.fsync(self._file.fileno())
+            self._unsynced = 0
+
+    def close(self, remove=False):
+        """Stop journaling; ``remove`` deletes the journal after a finished run."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if remove:
+            try:
+                self.path.unlink()
+            except FileNotFoundError:
+                pass
+
+
+def stable_base_name(base_name, key):
+    """
+    Make a base name unique to one input by appending a short hash of its
+    key, so the output filename does not depend on processing order.
+    """
+    return f"{base_name}-{hashlib.sha1(key.encode('utf-8')).hexdigest()[:8]}"
+
+
+def iter_card_jobs(records, output_dir, manifest=None, fingerprint=None, failures=None,
+                   journal=None, naming="sequential"):
+    """
+    Load each card and assign its output path, in input order.
+    Paths are assigned here (in the parent process) so filenames stay
+    deterministic no matter which worker finishes first.
+
+    With ``naming="sequential"`` colliding names get ``-2``, ``-3``, ...
+    suffixes in input order, which needs a stable input order. With
+    ``naming="stable"`` every name carries a hash of the input key instead,
+    so the order does not matter, and since such names cannot collide no
+    per-card state is kept and the output directory is not scanned.
+
+    With a manifest, unchanged cards are skipped and changed cards reuse the
+    output path they were built to last time. With a journal, cards finished
+    by an interrupted run are skipped and unfinished ones reuse the path they
+    had claimed. Cards that cannot be loaded are reported, added to
+    ``failures`` and skipped.
+    """
+    registry = None
+    if naming == "sequential":
+        registry = OutputNameRegistry(output_dir)
+        if manifest is not None:
+            for key in manifest.entries:
+                registry.reserve(manifest.output_path(key, output_dir))
+        if journal is not None:
+            for key in journal.claims:
+                registry.reserve(journal.claimed_path(key, output_dir))
+    for source, key, input_hash, fallback_name, load in records:
+        output_path = None
+        if manifest is not None:
+            if manifest.is_current(key, input_hash, fingerprint, output_dir):
+                manifest.skipped += 1
+                continue
+            output_path = manifest.output_path(key, output_dir)
+        if journal is not None:
+            claimed_path = journal.claimed_path(key, output_dir)
+            if journal.is_done(key, input_hash, output_dir):
+                journal.resumed += 1
+                if manifest is not None:
+                    manifest.record(key, input_hash, fingerprint, claimed_path)
+                continue
+            output_path = claimed_path or output_path
+
+        timer = StageTimer()
+        try:
+            with timer.stage("load"):
+                card_data = load()
+                validate_business_card(card_data)
+        except CardError as e:
+            report_failure(failures, source, str(e))
+            continue
+
+        if output_path is None:
+            base_name = slugify_name(card_data.get('name', ''))
+            if not base_name:
+                base_name = slugify_name(fallback_name)
+            if not base_name:
+                base_name = "card"
+            if registry is None:
+                output_path = Path(output_dir) / f"{stable_base_name(base_name, key)}.html"
+            else:
+                output_path = registry.claim(base_name)
+
+        if journal is not None:
+            journal.claim(key, input_hash, output_path)
+        yield CardJob(source, key, card_data, output_path, input_hash,
+                      timer.timings["load"])
+
+
+def run_jobs(func, jobs, workers, initializer=None, initargs=()):
+    """
+    Run ``func`` over ``jobs`` and yield ``(job, result)`` in input order.
+    With more than one worker the jobs are fanned out to a process pool,
+    keeping only a bounded number of them in flight at once.
+    ``initializer(*initargs)`` runs once in every process that runs jobs.
+    """
+    if workers <= 1:
+        if initializer is not None:
+            initializer(*initargs)
+        for job in jobs:
+            yield job, func(job)
+        return
+
+    window = workers * 4
+    pending = deque()
+    with ProcessPoolExecutor(max_workers=workers, initializer=initializer,
+                             initargs=initargs) as executor:
+        for job in jobs:
+            pending.append((job, executor.submit(func, job)))
+            if len(pending) >= window:
+                done_job, future = pending.popleft()
+                yield done_job, future.result()
+        while pending:
+            done_job, future = pending.popleft()
+            yield done_job, future.result()
+
+
+def parse_trim_order(value):
+    """argparse type for --trim-order: a comma separated list of optional fields."""
+    fields = tuple(field.strip() for field in value.split(",") if field.strip())
+    unknown = [field for field in fields if field not in OPTIONAL_FIELDS]
+    if unknown:
+        raise argparse.ArgumentTypeError(
+            f"unknown field(s) {', '.join(unknown)}; choose from {', '.join(OPTIONAL_FIELDS)}"
+        )
+    return fields
+
+
+def parse_args(argv=None):
+    """Parse command line options."""
     project_root = Path(__file__).parent
-    input_dir = project_root / "input"
-    template_path = project_root / "templates" / "card.html"
-    output_dir = project_root / "output"
+    parser = argparse.ArgumentParser(
+        description="Generate static HTML contact cards from JSON business card files."
+    )
+    parser.add_argument(
+        "--input-dir", type=Path, default=project_root / "input",
+        help="directory containing the *.json card files (default: input/)",
+    )
+    parser.add_argument(
+        "--jsonl", metavar="PATH",
+        help="read cards from a JSON Lines file (one card per line, '-' for stdin) "
+             "instead of --input-dir",
+    )
+    parser.add_argument(
+        "--stream", action="store_true",
+        help="stream --input-dir with os.scandir() instead of listing and sorting it "
+             "first (implies --naming stable)",
+    )
+    parser.add_argument(
+        "--naming", choices=("sequential", "stable"),
+        help="resolve name collisions with -2, -3 suffixes in input order (sequential, "
+             "the default) or with a hash of the input file name (stable)",
+    )
+    parser.add_argument(
+        "--output-dir", type=Path, default=project_root / "output",
+        help="directory to write the generated HTML files to (default: output/)",
+    )
+    parser.add_argument(
+        "--template", type=Path, default=project_root / "templates" / "card.html",
+        help="HTML template to render (default: templates/card.html)",
+    )
+    parser.add_argument(
+        "--stylesheet", choices=STYLESHEET_MODES, default="inline",
+        help="inline the stylesheet into every page, or write one shared minified "
+             "styles.<hash>.css and link it (default: inline)",
+    )
+    parser.add_argument(
+        "--precompress", action="store_true",
+        help="write .gz sidecars next to every page, and .br ones when brotli is "
+             "installed, for servers that serve precompressed files",
+    )
+    parser.add_argument(
+        "--minify", action="store_true",
+        help="minify the HTML and CSS of the templates (once per template version)",
+    )
+    parser.add_argument(
+        "--renderer", choices=RENDERERS, default="jinja",
+        help="render pages with Jinja or from a pre-split static skeleton, which "
+             "gives the same output faster (default: jinja)",
+    )
+    parser.add_argument(
+        "--cache-dir", type=Path, default=project_root / ".cache",
+        help="directory for persistent caches such as compiled templates (default: .cache/)",
+    )
+    parser.add_argument(
+        "--vcard-format", choices=list(VCARD_FORMATS), default="full",
+        help="contact payload in the QR code: the full vCard, a compact vCard or a "
+             "MECARD (default: full)",
+    )
+    parser.add_argument(
+        "--vcard-fold", action="store_true",
+        help="fold vCard lines longer than 75 octets, as RFC 2425 requires",
+    )
+    parser.add_argument(
+        "--max-qr-version", type=int, choices=range(1, 41), metavar="N",
+        help="largest QR version (1-40) a card may use; optional fields are trimmed "
+             "until the payload fits",
+    )
+    parser.add_argument(
+        "--max-payload-bytes", type=int, metavar="BYTES",
+        help="largest QR payload in bytes; optional fields are trimmed until it fits",
+    )
+    parser.add_argument(
+        "--trim-order", type=parse_trim_order, default=DEFAULT_TRIM_ORDER, metavar="FIELDS",
+        help="comma separated optional fields to trim, first to last, when a payload "
+             f"is over budget (default: {','.join(DEFAULT_TRIM_ORDER)})",
+    )
+    parser.add_argument(
+        "--qr-segmentation", choices=QR_SEGMENTATIONS, default="qrcode",
+        help="split the QR payload into numeric/alphanumeric/byte segments with "
+             "qrcode's chunking or with an optimal split (default: qrcode)",
+    )
+    parser.add_argument(
+        "--qr-format", choices=QR_FORMATS, default="png",
+        help="embed the QR code as a PNG data URI or as inline SVG (default: png)",
+    )
+    parser.add_argument(
+        "--qr-rasterizer", choices=QR_RASTERIZERS, default="pil",
+        help="draw PNG QR codes with PIL or with vectorized NumPy (default: pil)",
+    )
+    parser.add_argument(
+        "--png-encoder", choices=PNG_ENCODERS, default="pil",
+        help="encode PNG QR codes with PIL or with the lean 1-bit encoder, which "
+             "writes smaller files faster (default: pil)",
+    )
+    parser.add_argument(
+        "--qr-cache-size", type=int, default=DEFAULT_QR_CACHE_BYTES, metavar="BYTES",
+        help="maximum size of the persistent QR code cache; 0 disables it "
+             "(default: 256 MiB)",
+    )
+    parser.add_argument(
+        "--incremental", action="store_true",
+        help="only rebuild cards whose input or templates changed since the last "
+             "incremental run, overwriting their previous output",
+    )
+    parser.add_argument(
+        "--stats-json", type=Path, metavar="PATH",
+        help="write per-card stage timings and run totals to a JSON file",
+    )
+    parser.add_argument(
+        "-j", "--workers", type=int, default=os.cpu_count() or 1,
+        help="number of worker processes (default: number of CPUs)",
+    )
+    return parser.parse_args(argv)
+
+
+def print_failure_report(failures, limit=50):
+    """Summarise the cards that failed during the run."""
+    print(f"❌ {len(failures)} card(s) failed:")
+    for source, message in failures[:limit]:
+        print(f"   - {source}: {message}")
+    if len(failures) > limit:
+        print(f"   ... and {len(failures) - limit} more")
+
+
+def main(argv=None):
+    """Main entry point."""
+    args = parse_args(argv)
+    if args.qr_rasterizer == "numpy" and numpy is None:
+        print("Error: --qr-rasterizer numpy requires NumPy. Install with: pip install numpy")
+        sys.exit(1)
+    if args.vcard_fold and args.vcard_format == "mecard":
+        print("Error: --vcard-fold only applies to the full and compact vCard formats")
+        sys.exit(1)
+    if args.naming is None:
+        args.naming = "stable" if args.stream else "sequential"
+    input_dir = args.input_dir
+    output_dir = args.output_dir
 
     print("🎴 Business Card Generator")
     print("-" * 50)
 
-    json_paths = sorted(input_dir.glob("*.json"))
-    if not json_paths:
-        print(f"Error: No JSON files found in {input_dir}")
-        sys.exit(1)
+    failures = []
+    if args.jsonl:
+        if args.jsonl != "-" and not Path(args.jsonl).is_file():
+            print(f"Error: JSON Lines file not found at {args.jsonl}")
+            sys.exit(1)
+        records = iter_jsonl_records(args.jsonl, failures)
+        print(f"📦 Streaming cards from: {args.jsonl}")
+    elif args.stream:
+        if not input_dir.is_dir():
+            print(f"Error: Input directory not found at {input_dir}")
+            sys.exit(1)
+        records = iter_prefetched(iter_json_dir_records(input_dir))
+        print(f"📦 Streaming JSON files from: {input_dir}")
+    else:
+        json_paths = sorted(input_dir.glob("*.json"))
+        if not json_paths:
+            print(f"Error: No JSON files found in {input_dir}")
+            sys.exit(1)
+        records = iter_json_file_records(json_paths)
+        print(f"📦 Found {len(json_paths)} JSON file(s) in: {input_dir}")
 
     output_dir.mkdir(parents=True, exist_ok=True)
+    print(f"⚙️  Using {max(args.workers, 1)} worker process(es)")
 
-    print(f"📦 Found {len(json_paths)} JSON file(s) in: {input_dir}")
+    args.precompress_suffixes = sidecar_suffixes() if args.precompress else ()
+    if args.precompress:
+        print(f"🗜️  Writing {', '.join(args.precompress_suffixes)} sidecars")
+        if brotli is None:
+            print("   (install brotli for .br sidecars: pip install brotli)")
 
-    for json_path in json_paths:
+    args.stylesheet_href = None
+    stylesheet_bytes = 0
+    if args.stylesheet == "external":
+        try:
+            args.stylesheet_href, stylesheet_bytes = write_stylesheet(
+                args.template, output_dir, args.cache_dir)
+            if args.precompress_suffixes:
+                stylesheet_path = output_dir / args.stylesheet_href
+                # Named by content hash and never rewritten, so its current
+                # state is also the one its sidecars were made from
+                write_sidecars(stylesheet_path, args.precompress_suffixes,
+                               file_state(stylesheet_path))
+        except (OSError, TemplateError) as e:
+            print(f"Error: Could not write the shared stylesheet: {e}")
+            sys.exit(1)
+        print(f"🎨 Shared stylesheet: {output_dir / args.stylesheet_href} "
+              f"({stylesheet_bytes:,} bytes)")
+
+    fingerprint = build_fingerprint(args)
+    manifest = None
+    if args.incremental:
+        manifest = BuildManifest.load(output_dir)
+
+    journal = BuildJournal(output_dir, fingerprint)
+    if journal.interrupted:
+        print(f"🔁 Resuming interrupted run ({len(journal.done)} card(s) already finished)")
+    journal.open()
+
+    stats = RunStats(args.stats_json)
+    jobs = iter_card_jobs(records, output_dir, manifest, fingerprint, failures, journal,
+                          args.naming)
+    results = run_jobs(_build_card_job, jobs, args.workers,
+                       initializer=init_worker, initargs=(args,))
+    try:
+        for job, (output_path, timer, error) in results:
+            if error is not None:
+                report_failure(failures, job.source, error)
+                continue
+            print("-" * 50)
+            print(f"📖 Loaded card for: {job.card_data.get('name', 'Unknown')} ({job.source})")
+            if timer.trimmed:
+                print(f"✂️  Trimmed from the QR code to fit: {', '.join(timer.trimmed)}")
+            print(f"✅ Success! Website generated at: {output_path}")
+            journal.complete(job.key)
+            stats.record(job.source, timer)
+            if manifest is not None:
+                manifest.record(job.key, job.input_hash, fingerprint, output_path)
+    finally:
+        journal.close()
+    stats.finish()
+
+    if manifest is not None:
+        manifest.save()
         print("-" * 50)
-        print(f"📖 Loading business card data from: {json_path}")
-        card_data = load_business_card(json_path)
-        print(f"   ✓ Loaded card for: {card_data.get('name', 'Unknown')}")
-
-        base_name = slugify_name(card_data.get('name', ''))
-        if not base_name:
-            base_name = slugify_name(json_path.stem)
-        if not base_name:
-            base_name = "card"
-
-        output_path = choose_output_path(output_dir, base_name)
-
-        # Generate vCard
-        print("📝 Generating vCard format...")
-        vcard = generate_vcard(card_data)
-        print("   ✓ vCard generated")
-
-        # Generate QR code
-        print("📊 Generating QR code...")
-        qr_code_uri = generate_qr_code(vcard)
-        print("   ✓ QR code created (embedded as data URI)")
-
-        # Render template
-        print("🎨 Rendering HTML template...")
-        render_template(template_path, output_path, card_data, qr_code_uri)
-        print("   ✓ Template rendered")
-        print(f"✅ Success! Website generated at: {output_path}")
+        print(f"⏭️  Skipped {manifest.skipped} unchanged card(s)")
+    if journal.resumed:
+        print(f"⏭️  Skipped {journal.resumed} card(s) finished by the interrupted run")
+    journal.close(remove=True)
+
+    if args.qr_cache_size > 0:
+        get_qr_cache(qr_cache_path(args), args.qr_cache_size).prune()
 
     print("-" * 50)
+    stats.print_summary()
+    if stylesheet_bytes:
+        print(f"   + shared stylesheet: {stylesheet_bytes:,} bytes")
+    if args.stats_json:
+        stats.write_json()
+        print(f"📈 Timings written to: {args.stats_json}")
+
+    print("-" * 50)
+    if failures:
+        print_failure_report(failures)
+        sys.exit(1)
     print("✅ Done! Open the generated HTML file(s) in a web browser.")
 
 